@@ -0,0 +1,209 @@
+"""Headless batch runs: several formats and date ranges in one process, for cron.
+
+Each run is FORMAT or FORMAT:START[:END] with ISO dates. Runs without dates use
+--start/--end, which default to the last --days days. The month index pages of
+every run are listed together, and the oracle and HTTP session are loaded once
+and shared by all runs. Each run writes decks.csv, archetypes.csv and cards.csv
+to its own directory under --out.
+
+Usage:
+    python batch.py pioneer modern:2025-01-01:2025-01-31 [--days 7] [--out "Batch Results"]
+"""
+
+## Imports
+
+import argparse
+import datetime as dt
+import logging
+import os
+
+import pandas as pd
+
+from instrumentation import instrumentation
+from metagame import Metagame
+from mtgoScraper import ArchetypeAggregates, OracleTable, mtgoScrape
+
+## Batch
+
+batchOutputDir = "Batch Results"
+defaultDays = 7
+
+
+class batch:
+    def parseRun(spec: str, startDate, endDate):
+        """Parses FORMAT[:START[:END]] into (format, startDate, endDate)."""
+        parts = spec.split(":")
+        if len(parts) > 3 or not parts[0]:
+            raise ValueError(f"Runs are FORMAT[:START[:END]], got {spec}.")
+        format = parts[0].lower()
+        if len(parts) > 1 and parts[1]:
+            startDate = dt.date.fromisoformat(parts[1])
+        if len(parts) > 2 and parts[2]:
+            endDate = dt.date.fromisoformat(parts[2])
+        if startDate > endDate:
+            raise ValueError(f"{spec} starts after it ends.")
+        return format, startDate, endDate
+
+    def deckTable(decks: list, tourns: dict):
+        """One row per deck with its tournament and classification."""
+        return pd.DataFrame(
+            [
+                {
+                    "Deck URL": deck.deckId[0],
+                    "Deck": deck.deckId[1],
+                    "Format": tourns[deck.deckId[0]]["format"],
+                    "Date": tourns[deck.deckId[0]]["date"],
+                    "Deck Name": deck.deckName,
+                    "Colour": deck.colour,
+                    "Archetype": deck.archetype,
+                    "Key Cards": "; ".join(deck.keyCard),
+                    "Land Count": deck.landcount,
+                    "Avg CMC": deck.avgcmc,
+                }
+                for deck in decks
+            ],
+            columns=[
+                "Deck URL",
+                "Deck",
+                "Format",
+                "Date",
+                "Deck Name",
+                "Colour",
+                "Archetype",
+                "Key Cards",
+                "Land Count",
+                "Avg CMC",
+            ],
+        )
+
+    def archetypeSummary(decks: list, tournInfoList: list, format: str):
+        """Metagame.placement of the decks: count, share and win proxies per deck name."""
+        if len(decks) == 0:
+            return pd.DataFrame(
+                columns=["Decks", "Share", "Top 8 Rate", "Placement Score"]
+            ).rename_axis("Deck Name")
+        # Every scraped tournament is cached by now, so this reads no pages
+        decksByUrl = mtgoScrape.getDecksFromUrls(
+            [
+                x["url"]
+                for x in tournInfoList
+                if os.path.exists(mtgoScrape.cachedDecksPath(x["url"]))
+            ]
+        )
+        ranks = mtgoScrape.deckRanks(decksByUrl)
+        summaryDf = Metagame.fromDecks(decks, tournInfoList, ranks).placement(format)
+        return summaryDf.rename_axis("Deck Name")
+
+    def cardAggregates(decks: list):
+        """ArchetypeAggregates card tables of every deck name and board, stacked."""
+        aggregates = ArchetypeAggregates(decks)
+        tables = [
+            aggregates.cardTable(archetypeName, mainSide)
+            .reset_index()
+            .assign(**{"Deck Name": archetypeName, "Main/Side": mainSide})
+            for archetypeName in sorted(aggregates.counts)
+            for mainSide in ["Main", "Side"]
+        ]
+        columns = [
+            "Deck Name",
+            "Main/Side",
+            "Card Name",
+            "Quantity",
+            "Decks",
+            "Average",
+            "Inclusion",
+        ]
+        if len(tables) == 0:
+            return pd.DataFrame(columns=columns)
+        return pd.concat(tables, ignore_index=True)[columns]
+
+    def runDir(outDir: str, format: str, startDate, endDate):
+        return os.path.join(outDir, f"{format}_{startDate}_{endDate}")
+
+    def writeRun(directory: str, deckDf, summaryDf, cardDf):
+        os.makedirs(directory, exist_ok=True)
+        deckDf.to_csv(os.path.join(directory, "decks.csv"), index=False)
+        summaryDf.to_csv(os.path.join(directory, "archetypes.csv"))
+        cardDf.to_csv(os.path.join(directory, "cards.csv"), index=False)
+
+    @instrumentation.run("batch.run")
+    def run(
+        runs: list,
+        outDir: str = batchOutputDir,
+        skip=(),
+        workers: int = 4,
+        processes: int = 1,
+    ):
+        """Scrapes, classifies and writes every (format, startDate, endDate) run.
+
+        Args:
+            runs (list): (format, startDate, endDate) tuples
+            outDir (str, optional): Each run writes to a subdirectory named after it
+            skip (list, optional): Tournament URLs to leave out
+            workers (int, optional): Concurrent requests. Defaults to 4.
+            processes (int, optional): Process pool size for mtgoScrapeMain. Defaults to 1.
+
+        Returns:
+            dict: {run directory: number of decks}
+        """
+        tournInfoList = mtgoScrape.formatDeckListRange(
+            sorted({x[0] for x in runs}),
+            min(x[1] for x in runs),
+            max(x[2] for x in runs),
+            workers,
+        )
+        skip = set(skip)
+        tournInfoList = [x for x in tournInfoList if x["url"] not in skip]
+        OracleTable.shared()
+        results = {}
+        for format, startDate, endDate in runs:
+            tourns = [
+                x
+                for x in tournInfoList
+                if x["format"] == format and startDate <= x["date"] <= endDate
+            ]
+            decks = []
+            if tourns:
+                decks = mtgoScrape.mtgoScrapeMain(
+                    [x["url"] for x in tourns], format, workers, processes
+                )
+            directory = batch.runDir(outDir, format, startDate, endDate)
+            batch.writeRun(
+                directory,
+                batch.deckTable(decks, {x["url"]: x for x in tourns}),
+                batch.archetypeSummary(decks, tourns, format),
+                batch.cardAggregates(decks),
+            )
+            results[directory] = len(decks)
+            logging.info(
+                f"{format} {startDate} to {endDate}: {len(tourns)} tournament(s), "
+                f"{len(decks)} deck(s) written to {directory}."
+            )
+        return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument("runs", nargs="+", help="FORMAT or FORMAT:START[:END]")
+    parser.add_argument("--start", type=dt.date.fromisoformat)
+    parser.add_argument("--end", type=dt.date.fromisoformat, help="Defaults to today")
+    parser.add_argument(
+        "--days",
+        type=int,
+        default=defaultDays,
+        help="Days before --end that --start defaults to",
+    )
+    parser.add_argument("--out", default=batchOutputDir)
+    parser.add_argument("--skip", nargs="*", default=[], help="Tournament URLs")
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--processes", type=int, default=1)
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+    end = args.end or dt.date.today()
+    start = args.start or end - dt.timedelta(days=args.days)
+    runs = [batch.parseRun(x, start, end) for x in args.runs]
+    results = batch.run(runs, args.out, args.skip, args.workers, args.processes)
+    for directory, deckCount in results.items():
+        print(f"{directory}: {deckCount} deck(s)")
@@ -0,0 +1,584 @@
+"""Benchmarks for the slow stages of the scraping and analysis pipeline.
+
+Usage:
+    python benchmark.py suite [--save PATH] [--compare PATH] [--tolerance 0.2]
+    python benchmark.py expandFaces [--bulk PATH]
+    python benchmark.py deckParsing [--cache DIR]
+    python benchmark.py classification [--cache DIR] [--format FORMAT] [--bulk PATH]
+    python benchmark.py imports
+"""
+
+import argparse
+import datetime as dt
+import itertools
+import json
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import pandas as pd
+
+from config import mtgColourComboNameDict, mtgKeyToArchetypeDict
+from mtgoScraper import (
+    ArchetypeRules,
+    OracleTable,
+    Queries,
+    cardNames,
+    dataAnalysis,
+    decklistCacheDir,
+    identifyDeck,
+    mtgoScrape,
+    oracle,
+    oracleCacheDir,
+)
+from network import network
+
+fixturesDir = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures")
+
+
+def bestOf(func, repeat: int = 3):
+    """Runs func `repeat` times and returns (best wall time in seconds, last result)."""
+    best = float("inf")
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func()
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+
+def report(name: str, seconds: float, items: int, unit: str):
+    print(f"{name:<32} {seconds * 1000:>10.1f} ms {items / seconds:>12.0f} {unit}/s")
+
+
+def benchExpandFaces(bulkPath=None, repeat: int = 3):
+    """Compares the row-wise `expand_faces` apply with the column-oriented `expandFaces`."""
+    oracleDf = oracle.clean(bulkPath, stream=True)
+    oracleDf["colors"] = oracleDf["colors"].fillna(oracleDf["color_identity"])
+    applyTime, applyDf = bestOf(
+        lambda: oracleDf.apply(oracle.expand_faces, axis=1), repeat
+    )
+    vectorTime, vectorDf = bestOf(lambda: oracle.expandFaces(oracleDf), repeat)
+    cols = [x for x in vectorDf.columns if x != "card_faces"]
+    pd.testing.assert_frame_equal(
+        applyDf.reindex(columns=cols).astype(object).where(applyDf.notna(), None),
+        vectorDf[cols].astype(object).where(vectorDf[cols].notna(), None),
+        check_dtype=False,
+    )
+    report("expand_faces apply", applyTime, len(oracleDf), "cards")
+    report("expandFaces", vectorTime, len(oracleDf), "cards")
+    print(f"Speedup: {applyTime / vectorTime:.1f}x")
+
+
+def loadDecklistCache(cacheDir: str = decklistCacheDir):
+    """Reads every cached tournament JSON into {url: decks dict}."""
+    decksByUrl = {}
+    for filename in sorted(os.listdir(cacheDir)):
+        if filename.endswith(".json"):
+            with open(os.path.join(cacheDir, filename), "r") as f:
+                decksByUrl[f"/decklist/{filename[:-5]}"] = json.load(f)
+    return decksByUrl
+
+
+def legacyDeckLists(decksByUrl: dict):
+    """The per-deck DataFrame chain getDeckListsFromUrlList used before flattenDecks."""
+    resultsLists = []
+    for eachUrl, tempDict in decksByUrl.items():
+        tempDf = mtgoScrape.getDeckListsFromResults(tempDict)
+        tempDf["Deck URL"] = eachUrl
+        resultsLists += [tempDf]
+    outDf = pd.concat(resultsLists).reset_index(drop=False)
+    outDf = outDf.drop(columns=["index"])
+    outDf["Card Name"] = outDf["Card Name"].str.split(" // ").str[0]
+    outDf["Card Name"] = outDf["Card Name"].str.split("/").str[0]
+    outDf = outDf.set_index(["Deck URL", "Deck", "Main/Side", "Card Name"])
+    return outDf.sort_index()
+
+
+def benchDeckParsing(cacheDir: str = decklistCacheDir, repeat: int = 3):
+    """Compares the per-deck DataFrame chain with the single-pass flattenDecks parser."""
+    decksByUrl = loadDecklistCache(cacheDir)
+    deckCount = sum(len(x) for x in decksByUrl.values())
+    legacyTime, legacyDf = bestOf(lambda: legacyDeckLists(decksByUrl), repeat)
+    flatTime, flatDf = bestOf(lambda: mtgoScrape.buildDeckLists(decksByUrl), repeat)
+    pd.testing.assert_frame_equal(
+        legacyDf, flatDf[["Quantity"]], check_dtype=False, check_index_type=False
+    )
+    print(f"{len(decksByUrl)} tournaments, {deckCount} decks, {len(flatDf)} rows")
+    report("deckCleaner chain", legacyTime, deckCount, "decks")
+    report("flattenDecks", flatTime, deckCount, "decks")
+    print(f"Speedup: {legacyTime / flatTime:.1f}x")
+
+
+def legacyClassification(deckDf, qf: str, oracleDf):
+    """The per-deck DataFrame path setDecksToClasses took before classifyDecks: one
+    oracle merge, then a `.loc` slice and pandas reductions for every deck.
+
+    Returns:
+        list: (deckId, colour, key cards, land count, avg cmc, deck name) per deck
+    """
+    keyCards = ArchetypeRules.keyCardMapping.get(qf, [])
+    deckDf = mtgoScrape.removeCardIndex(deckDf)
+    deckDf = identifyDeck.enrichDataFrame(deckDf.reset_index(), oracleDf)
+    deckDf = deckDf.set_index(["Deck URL", "Deck"])
+    decks = []
+    for deckId in deckDf.index.unique():
+        eachDf = deckDf.loc[[deckId]].sort_values(by="Quantity", ascending=False)
+        mainCards = list(eachDf[eachDf["Main/Side"] == "Main"]["Card Name"])
+        colour = mtgColourComboNameDict[identifyDeck.getDeckColour(eachDf)]
+        keyCard = [x for x in keyCards if x in mainCards]
+        isLand = eachDf["type_line"].str.contains("Land")
+        landcount = int(eachDf[isLand]["Quantity"].sum())
+        avgcmc = float(eachDf[~isLand]["cmc"].mean())
+        if keyCard:
+            archetype = mtgKeyToArchetypeDict.get(keyCard[0], keyCard[0])
+        elif landcount < 22:
+            archetype = "Aggro"
+        elif landcount > 26:
+            archetype = "Control"
+        else:
+            archetype = ""
+        decks.append(
+            (deckId, colour, keyCard, landcount, avgcmc, f"{colour} {archetype}")
+        )
+    return decks
+
+
+def benchClassification(
+    cacheDir: str = decklistCacheDir,
+    qf: str = "pioneer",
+    bulkPath=None,
+    repeat: int = 3,
+):
+    """Compares the per-deck DataFrame classification with the batch classifyDecks."""
+    decksByUrl = {
+        k: v for k, v in loadDecklistCache(cacheDir).items() if f"/{qf}-" in k
+    }
+    deckDf = mtgoScrape.buildDeckLists(decksByUrl)
+    if bulkPath is None:
+        oracleDf = oracle.expandedClean()
+    else:
+        oracleDf = oracle.buildExpandedClean(bulkPath)
+    table = OracleTable.shared(oracleDf)
+    perDeckTime, decks = bestOf(
+        lambda: legacyClassification(deckDf, qf, oracleDf), repeat
+    )
+    batchTime, summaryDf = bestOf(
+        lambda: mtgoScrape.classifyDecks(deckDf, qf, table), repeat
+    )
+    legacyDf = pd.DataFrame(
+        [x[1:] for x in decks],
+        index=pd.MultiIndex.from_tuples([x[0] for x in decks]),
+        columns=["Colour", "Key Cards", "Land Count", "Avg CMC", "Deck Name"],
+    )
+    compared = ["Colour", "Land Count", "Avg CMC"]
+    if not os.path.exists(os.path.join(ArchetypeRules.directory, f"{qf}.json")):
+        # Formats with a rule file are no longer classified by the key card list
+        compared += ["Key Cards", "Deck Name"]
+    pd.testing.assert_frame_equal(
+        legacyDf[compared],
+        summaryDf[compared],
+        check_dtype=False,
+        check_index_type=False,
+        check_names=False,
+    )
+    print(f"{len(decksByUrl)} {qf} tournaments, {len(summaryDf)} decks")
+    report("per-deck DataFrame", perDeckTime, len(summaryDf), "decks")
+    report("classifyDecks", batchTime, len(summaryDf), "decks")
+    print(f"Speedup: {perDeckTime / batchTime:.1f}x")
+
+
+## Import time
+
+importStatements = {
+    "analysis": "import mtgoScraper",
+    "deck store and metagame": "import metagame",
+    "GUI job runner": "import jobs",
+    "notebook": "from mtgoScraper import *",
+    "browser scraping": "import browser",
+}
+heavyModules = ["matplotlib.pyplot", "selenium.webdriver", "bs4"]
+
+
+def importTime(statement: str):
+    """Runs `statement` in a fresh interpreter.
+
+    Returns:
+        tuple: (seconds the statement took, heavy modules it loaded)
+    """
+    code = (
+        "import json, sys, time\n"
+        "start = time.perf_counter()\n"
+        f"{statement}\n"
+        "seconds = time.perf_counter() - start\n"
+        f"print(json.dumps([seconds, [x for x in {heavyModules!r} if x in sys.modules]]))"
+    )
+    output = subprocess.run(
+        [sys.executable, "-c", code],
+        cwd=os.path.dirname(os.path.abspath(__file__)),
+        capture_output=True,
+        text=True,
+        check=True,
+    ).stdout
+    return json.loads(output.splitlines()[-1])
+
+
+def benchImports(repeat: int = 3):
+    """Import time of each entry point, and which heavy dependencies it pulls in.
+
+    Only plotting and browser scraping should load matplotlib, selenium and bs4.
+    """
+    print(f"{'entry point':<26} {'statement':<28} {'wall':>10}  heavy modules")
+    for name, statement in importStatements.items():
+        runs = [importTime(statement) for _ in range(repeat)]
+        seconds = min(x[0] for x in runs)
+        loaded = ", ".join(runs[-1][1]) or "-"
+        print(f"{name:<26} {statement:<28} {seconds * 1000:>7.0f} ms  {loaded}")
+
+
+## End-to-end suite
+
+
+def measure(func, repeat: int = 3, setup=None):
+    """Best wall time of `repeat` runs, then the peak traced memory of one more.
+
+    Args:
+        func (callable): Stage to run
+        repeat (int, optional): Timed runs. Defaults to 3.
+        setup (callable, optional): Run untimed before every run, e.g. to clear caches
+
+    Returns:
+        tuple: (best seconds, peak bytes, last result)
+    """
+    best = float("inf")
+    for _ in range(repeat):
+        if setup is not None:
+            setup()
+        start = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - start)
+    if setup is not None:
+        setup()
+    tracemalloc.start()
+    result = func()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return best, peak, result
+
+
+def fixtureUrls(fixtures: str):
+    """{url: fixture file} for every response the suite replays."""
+    urls = {}
+    pageDir = os.path.join(fixtures, "decklists")
+    for filename in sorted(os.listdir(pageDir)):
+        format, year, month = os.path.splitext(filename)[0].split("-")
+        url = mtgoScrape.deckListPageUrl(format, int(year), int(month))
+        urls[url] = os.path.join(pageDir, filename)
+    return urls
+
+
+def replayFixtures(fixtures: str, workDir: str):
+    """Copies the corpus into workDir and serves it through network replay, so
+    every stage runs its real code path without touching the network.
+
+    Returns:
+        tuple: (formats, first date, last date) covered by the month index pages
+    """
+    shutil.copytree(
+        os.path.join(fixtures, decklistCacheDir),
+        os.path.join(workDir, decklistCacheDir),
+    )
+    recordDir = os.path.join(workDir, "HTTP Recordings")
+    bulkUrl = "https://data.scryfall.io/oracle-cards/fixture.json"
+    manifest = {
+        "object": "list",
+        "data": [
+            {
+                "type": "oracle_cards",
+                "updated_at": "fixture",
+                "download_uri": bulkUrl,
+            }
+        ],
+    }
+    responses = {oracle.manifestUrl: json.dumps(manifest).encode("utf-8")}
+    with open(os.path.join(fixtures, "scryfall-oracle-cards.json"), "rb") as f:
+        responses[bulkUrl] = f.read()
+    pages = fixtureUrls(fixtures)
+    for url, path in pages.items():
+        with open(path, "rb") as f:
+            responses[url] = f.read()
+    for url, body in responses.items():
+        meta = {"url": url, "status": 200, "headers": {}, "fetched": time.time()}
+        network.writeEntry(recordDir, url, meta, body)
+    network.setMode("replay", recordDir)
+    stems = [os.path.splitext(os.path.basename(x))[0] for x in pages.values()]
+    formats = sorted({x.split("-")[0] for x in stems})
+    months = sorted({(int(x.split("-")[1]), int(x.split("-")[2])) for x in stems})
+    startDate = dt.date(*months[0], 1)
+    endDate = (pd.Timestamp(dt.date(*months[-1], 1)) + pd.offsets.MonthEnd()).date()
+    return formats, startDate, endDate
+
+
+def parseTournamentPages(fixtures: str):
+    """Parses every saved tournament page and checks it against the cached JSON of
+    the same tournament.
+
+    Returns:
+        int: Number of decks parsed
+    """
+    pageDir = os.path.join(fixtures, "pages")
+    deckCount = 0
+    for filename in sorted(os.listdir(pageDir)):
+        stem = os.path.splitext(filename)[0]
+        with open(os.path.join(pageDir, filename), "r") as f:
+            deckDict = mtgoScrape.parseDecksFromPage(f.read())
+        with open(os.path.join(fixtures, decklistCacheDir, f"{stem}.json"), "r") as f:
+            if deckDict != json.load(f):
+                raise AssertionError(f"{filename} does not parse to {stem}.json.")
+        deckCount += len(deckDict)
+    return deckCount
+
+
+def clusterFormats(decksByFormat: dict):
+    """Clusters each format's decks and checks that no characteristic card, and so
+    no suggested archetype, is a land.
+
+    Returns:
+        int: Number of decks clustered
+    """
+    basics = {"Plains", "Island", "Swamp", "Mountain", "Forest"}
+    deckCount = 0
+    for format, decks in decksByFormat.items():
+        _, proposalDf = dataAnalysis.clusterDecks(decks)
+        for cluster, cards in proposalDf["Characteristic Cards"].items():
+            ids = cardNames.cardIds(cards)
+            if basics & set(cards) or decks[0].oracleTable.isLand[ids].any():
+                raise AssertionError(
+                    f"{format} cluster {cluster} is named after lands: {cards}."
+                )
+        deckCount += len(decks)
+    return deckCount
+
+
+def resetOracle():
+    oracle._memo = {}
+    shutil.rmtree(oracleCacheDir, ignore_errors=True)
+
+
+def runQueries(decks: list):
+    """The notebook query mix: archetype tables for the five most played
+    archetypes, and include/exclude filters on three of the key cards.
+    """
+    aggregates = Queries.buildAggregates(decks)
+    index = Queries.buildIndex(decks)
+    archetypes = pd.Series([x.deckName for x in decks]).value_counts().index[:5]
+    for archetype in archetypes:
+        Queries.avgArchetype(decks, archetype, "Main", aggregates)
+        Queries.aggArchetype(decks, archetype, "Side", aggregates)
+    keyCards = list(dict.fromkeys(x.keyCard[0] for x in decks if x.keyCard))[:3]
+    for included, excluded in itertools.permutations(keyCards, 2):
+        if Queries.decksWithCard(decks, [included], "Main", [excluded], "Main", index):
+            Queries.avgDecksWithCard(
+                decks, [included], "Main", [excluded], "Main", "Main", index
+            )
+    return len(decks)
+
+
+def jaccardPairs(mainDf, pairCount: int):
+    deckIds = list(mainDf.index.unique())
+    pairs = list(itertools.combinations(deckIds, 2))[:pairCount]
+    return [dataAnalysis.getJaccardForPair(x, y, mainDf) for x, y in pairs]
+
+
+def runSuite(fixtures: str = fixturesDir, repeat: int = 3, pairCount: int = 100):
+    """Times every pipeline stage over the fixture corpus.
+
+    Returns:
+        dict: {stage: {"seconds", "peakBytes", "items", "unit"}}
+    """
+    results = {}
+    fixtures = os.path.abspath(fixtures)
+
+    def stage(name, func, items, unit, setup=None):
+        seconds, peak, result = measure(func, repeat, setup)
+        count = items(result) if callable(items) else items
+        results[name] = {
+            "seconds": seconds,
+            "peakBytes": peak,
+            "items": count,
+            "unit": unit,
+        }
+        print(
+            f"{name:<28} {seconds * 1000:>10.1f} ms {peak / 2**20:>9.1f} MiB "
+            f"{count / seconds:>12.0f} {unit}/s"
+        )
+        return result
+
+    cwd = os.getcwd()
+    workDir = tempfile.mkdtemp(prefix="mtgo-benchmark-")
+    mode, recordDir = network.mode, network.recordDir
+    rulesDir = ArchetypeRules.directory
+    try:
+        formats, startDate, endDate = replayFixtures(fixtures, workDir)
+        ArchetypeRules.directory = os.path.join(fixtures, "archetypes")
+        os.chdir(workDir)
+        print(f"{'stage':<28} {'wall':>13} {'peak':>13} {'throughput':>18}")
+        tourns = stage(
+            "formatDeckList",
+            lambda: mtgoScrape.formatDeckListRange(formats, startDate, endDate, 1),
+            len,
+            "tournaments",
+        )
+        urls = [x["url"] for x in tourns]
+        deckDf = stage(
+            "getDeckListsFromUrlList",
+            lambda: mtgoScrape.getDeckListsFromUrlList(urls),
+            lambda x: len(mtgoScrape.deckArrays(x)[0]),
+            "decks",
+        )
+        deckCount = results["getDeckListsFromUrlList"]["items"]
+        stage(
+            "parseDecksFromPage",
+            lambda: parseTournamentPages(fixtures),
+            lambda x: x,
+            "decks",
+        )
+        oracleDf = stage(
+            "oracle.expandedClean cold",
+            oracle.expandedClean,
+            len,
+            "cards",
+            setup=resetOracle,
+        )
+        stage(
+            "oracle.expandedClean warm",
+            oracle.expandedClean,
+            len,
+            "cards",
+            setup=lambda: oracle._memo.clear(),
+        )
+        OracleTable.shared(oracleDf)
+        byFormat = {
+            x: deckDf[deckDf.index.get_level_values("Deck URL").str.contains(f"/{x}-")]
+            for x in formats
+        }
+        decksByFormat = stage(
+            "setDecksToClasses",
+            lambda: {
+                x: mtgoScrape.setDecksToClasses(y, x) for x, y in byFormat.items()
+            },
+            deckCount,
+            "decks",
+        )
+        stage(
+            "Queries",
+            lambda: sum(runQueries(x) for x in decksByFormat.values()),
+            lambda x: x,
+            "decks",
+        )
+        mainDf = mtgoScrape.removeCardIndex(deckDf)
+        mainDf = mainDf[mainDf["Main/Side"] == "Main"].drop(columns=["Card ID"])
+        stage(
+            "getJaccardForPair",
+            lambda: jaccardPairs(mainDf, pairCount),
+            len,
+            "pairs",
+        )
+        stage(
+            "jaccardMatrix",
+            lambda: dataAnalysis.jaccardMatrix(deckDf),
+            deckCount,
+            "decks",
+        )
+        stage(
+            "clusterDecks",
+            lambda: clusterFormats(decksByFormat),
+            lambda x: x,
+            "decks",
+        )
+    finally:
+        os.chdir(cwd)
+        network.setMode(mode, recordDir)
+        ArchetypeRules.directory = rulesDir
+        shutil.rmtree(workDir, ignore_errors=True)
+    return results
+
+
+def saveBaseline(results: dict, path: str):
+    baseline = {
+        "python": sys.version.split()[0],
+        "platform": platform.platform(),
+        "created": dt.datetime.now().isoformat(timespec="seconds"),
+        "stages": results,
+    }
+    with open(path, "w") as f:
+        json.dump(baseline, f, indent=2)
+    print(f"Baseline saved to {path}")
+
+
+def compareBaseline(results: dict, path: str, tolerance: float = 0.2):
+    """Prints each stage's time and peak memory relative to a saved baseline.
+
+    Returns:
+        list: Stages more than `tolerance` slower than the baseline
+    """
+    with open(path, "r") as f:
+        baseline = json.load(f)
+    print(f"\nAgainst {path} ({baseline['created']}, Python {baseline['python']})")
+    regressions = []
+    for name, result in results.items():
+        if name not in baseline["stages"]:
+            print(f"{name:<28} {'new stage':>12}")
+            continue
+        before = baseline["stages"][name]
+        timeRatio = result["seconds"] / before["seconds"]
+        memoryRatio = result["peakBytes"] / max(before["peakBytes"], 1)
+        flag = ""
+        if timeRatio > 1 + tolerance:
+            flag = "  SLOWER"
+            regressions.append(name)
+        elif timeRatio < 1 / (1 + tolerance):
+            flag = "  faster"
+        print(f"{name:<28} {timeRatio:>8.2f}x time {memoryRatio:>8.2f}x memory{flag}")
+    return regressions
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument(
+        "benchmark",
+        choices=["suite", "expandFaces", "deckParsing", "classification", "imports"],
+    )
+    parser.add_argument("--bulk", help="Local Scryfall bulk file (default: download)")
+    parser.add_argument("--cache", default=decklistCacheDir, help="Decklist JSON cache")
+    parser.add_argument("--format", default="pioneer", help="Format to classify")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--fixtures", default=fixturesDir, help="Fixture corpus")
+    parser.add_argument("--save", help="Write the suite results as a baseline")
+    parser.add_argument("--compare", help="Baseline to compare the suite against")
+    parser.add_argument(
+        "--tolerance",
+        type=float,
+        default=0.2,
+        help="Slowdown that counts as a regression",
+    )
+    args = parser.parse_args()
+    if args.benchmark == "suite":
+        results = runSuite(args.fixtures, args.repeat)
+        if args.save:
+            saveBaseline(results, args.save)
+        if args.compare and compareBaseline(results, args.compare, args.tolerance):
+            sys.exit(1)
+    elif args.benchmark == "expandFaces":
+        benchExpandFaces(args.bulk, args.repeat)
+    elif args.benchmark == "deckParsing":
+        benchDeckParsing(args.cache, args.repeat)
+    elif args.benchmark == "classification":
+        benchClassification(args.cache, args.format, args.bulk, args.repeat)
+    elif args.benchmark == "imports":
+        benchImports(args.repeat)
@@ -0,0 +1,129 @@
+## Imports
+
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from selenium import webdriver
+from selenium.common.exceptions import WebDriverException
+from selenium.webdriver.chrome.options import Options
+from selenium.webdriver.common.by import By
+
+from instrumentation import instrumentation
+from mtgoScraper import mtgoScrape
+
+## Browser Scraping
+# Selenium is only needed when a tournament page has to be rendered, so it lives
+# here and mtgoScraper imports this module on first use.
+
+
+class browser:
+    def newDriver():
+        """Starts a headless Chrome driver for scraping tournament pages."""
+        options = Options()
+        options.add_argument("--headless")
+        options.add_argument("--disable-gpu")
+        options.add_argument("--disable-extensions")
+        options.add_argument("--blink-settings=imagesEnabled=false")
+        return webdriver.Chrome(options=options)
+
+    def readDecks(driver):
+        """Reads the decklists off a rendered tournament page.
+
+        Returns:
+            dict: {"Deck i": {"main": ..., "side": ...}}, as getDecksFromUrlScrape
+        """
+        deckLen = len(driver.find_elements(By.CSS_SELECTOR, '[id*="Decklist"]'))
+        mainDecks = [
+            driver.find_element(
+                by=By.CSS_SELECTOR,
+                value=f"#decklist{i}Decklist > div:nth-child(2) > div:nth-child(1) > div:nth-child(1)",
+            ).text
+            for i in range(deckLen)
+        ]
+        sideBoards = [
+            driver.find_element(
+                by=By.CSS_SELECTOR,
+                value=f"#decklist{i}Decklist > div:nth-child(2) > div:nth-child(1) > ul:nth-child(4)",
+            ).text
+            for i in range(deckLen)
+        ]
+        deckDict = {}
+        for i in range(deckLen):
+            deckDict[f"Deck {i}"] = {"main": mainDecks[i], "side": sideBoards[i]}
+        return deckDict
+
+
+class BrowserPool:
+    """A fixed number of long-lived headless Chrome drivers that scrape tournament
+    pages concurrently, one driver per worker thread.
+
+    Drivers are recycled after `maxPages` pages or when they crash, and the time
+    spent on each url is kept in `timings`.
+    """
+
+    def __init__(self, size: int = 4, maxPages: int = 25):
+        self.size = size
+        self.maxPages = maxPages
+        self.timings = {}
+        self._local = threading.local()
+        self._drivers = set()
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=size)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def _driver(self):
+        if getattr(self._local, "driver", None) is None:
+            self._local.driver = mtgoScrape.newDriver()
+            self._local.pages = 0
+            with self._lock:
+                self._drivers.add(self._local.driver)
+        return self._local.driver
+
+    def _retire(self):
+        driver = self._local.driver
+        self._local.driver = None
+        with self._lock:
+            self._drivers.discard(driver)
+        try:
+            driver.quit()
+        except WebDriverException:
+            pass
+
+    def fetch(self, url: str):
+        start = time.perf_counter()
+        try:
+            deckDict = mtgoScrape.getDecksFromUrlScrape(url, self._driver())
+        except WebDriverException:
+            logging.warning(f"Browser crashed on {url}, retrying with a new driver.")
+            instrumentation.count("browserPool.crashes")
+            self._retire()
+            deckDict = mtgoScrape.getDecksFromUrlScrape(url, self._driver())
+        self._local.pages += 1
+        if self._local.pages >= self.maxPages:
+            self._retire()
+        self.timings[url] = time.perf_counter() - start
+        instrumentation.record("BrowserPool.fetch", self.timings[url])
+        logging.info(f"Scraped {url} in {self.timings[url]:.1f}s.")
+        return deckDict
+
+    def map(self, listOfUrls: list):
+        """Scrapes every url and returns {url: decks dict}."""
+        return dict(zip(listOfUrls, self._executor.map(self.fetch, listOfUrls)))
+
+    def close(self):
+        self._executor.shutdown(wait=True)
+        with self._lock:
+            drivers = list(self._drivers)
+            self._drivers.clear()
+        for driver in drivers:
+            try:
+                driver.quit()
+            except WebDriverException:
+                pass
@@ -82,6 +82,10 @@ modernKeyCardList = [
 
 ]
 
+legacyKeyCardList = [
+
+]
+
 mtgKeyToArchetypeDict = {
     "Agatha's Soul Cauldron": "Cauldron",
     "Emberheart Challenger": "Mice",
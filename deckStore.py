@@ -0,0 +1,342 @@
+## Imports
+
+import datetime as dt
+import json
+import logging
+import os
+import re
+import sqlite3
+
+import pandas as pd
+
+from mtgoScraper import cardNames, decklistCacheDir, mtgoScrape
+
+## Deck Store
+
+deckStorePath = "MTGO Decks.sqlite"
+
+# A tournament page that still has no decks after this many runs is given up on,
+# so it stops holding back its format's watermark
+maxEmptyAttempts = 3
+
+schema = """
+CREATE TABLE IF NOT EXISTS tournaments (
+    url TEXT PRIMARY KEY,
+    name TEXT,
+    date TEXT NOT NULL,
+    format TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS tournaments_format_date ON tournaments (format, date);
+CREATE TABLE IF NOT EXISTS deck_rows (
+    url TEXT NOT NULL REFERENCES tournaments (url),
+    deck TEXT NOT NULL,
+    main_side TEXT NOT NULL,
+    card TEXT NOT NULL,
+    quantity INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS deck_rows_url ON deck_rows (url);
+CREATE TABLE IF NOT EXISTS watermarks (
+    format TEXT PRIMARY KEY,
+    date TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS deck_summaries (
+    url TEXT NOT NULL REFERENCES tournaments (url),
+    deck TEXT NOT NULL,
+    colour TEXT,
+    key_cards TEXT,
+    land_count INTEGER,
+    avg_cmc REAL,
+    archetype TEXT,
+    deck_name TEXT,
+    PRIMARY KEY (url, deck)
+);
+CREATE TABLE IF NOT EXISTS empty_tournaments (
+    url TEXT PRIMARY KEY,
+    attempts INTEGER NOT NULL,
+    last_attempt TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS deck_ranks (
+    url TEXT NOT NULL REFERENCES tournaments (url),
+    deck TEXT NOT NULL,
+    rank INTEGER NOT NULL,
+    PRIMARY KEY (url, deck)
+);
+"""
+
+
+class deckStore:
+    """Append-only SQLite store of parsed decklist rows.
+
+    Each tournament is parsed and written once, and analysis reads rows back
+    filtered by format and date in SQL instead of re-parsing the JSON cache.
+    """
+
+    def connect(path: str = deckStorePath):
+        con = sqlite3.connect(path)
+        con.execute("PRAGMA journal_mode=WAL")
+        con.executescript(schema)
+        return con
+
+    def storedUrls(con, format=None):
+        if format is None:
+            rows = con.execute("SELECT url FROM tournaments")
+        else:
+            rows = con.execute(
+                "SELECT url FROM tournaments WHERE format = ?", (format,)
+            )
+        return {x[0] for x in rows}
+
+    def abandonedUrls(con, attempts: int = maxEmptyAttempts):
+        """Tournaments whose page came back without decks on `attempts` runs."""
+        rows = con.execute(
+            "SELECT url FROM empty_tournaments WHERE attempts >= ?", (attempts,)
+        )
+        return {x[0] for x in rows}
+
+    def deckRows(url: str, decksDict: dict):
+        """Flattens a tournament's decks dict into (url, deck, main/side, card, quantity) rows."""
+        rows = []
+        for eachDeck, boards in decksDict.items():
+            for mainSide, key in [("Main", "main"), ("Side", "side")]:
+                cards = mtgoScrape.deckStringCleaner(boards[key])
+                for card, quantity in cards.items():
+                    card = cardNames.normalize(card)
+                    rows.append((url, eachDeck, mainSide, card, quantity))
+        return rows
+
+    def writeTournament(con, tournInfo: dict, decksDict: dict):
+        """Stores one tournament's decks. Tournaments already in the store are left untouched.
+
+        Args:
+            con (Connection): Store connection
+            tournInfo (dict): Tournament dict from formatDeckList, with 'name', 'date', 'url', 'format'
+            decksDict (dict): Output of getDecksFromUrl for that tournament
+
+        Returns:
+            bool: Whether the tournament was written
+        """
+        if not decksDict:
+            # A page that rendered without decks is left out, so a later run retries
+            # it, until it has come back empty maxEmptyAttempts times
+            logging.warning(f"No decks found for {tournInfo['url']}, not storing it.")
+            with con:
+                con.execute(
+                    "INSERT INTO empty_tournaments VALUES (?, 1, ?) "
+                    "ON CONFLICT (url) DO UPDATE SET attempts = attempts + 1, "
+                    "last_attempt = excluded.last_attempt",
+                    (tournInfo["url"], dt.datetime.now().isoformat(timespec="seconds")),
+                )
+            return False
+        with con:
+            inserted = con.execute(
+                "INSERT OR IGNORE INTO tournaments VALUES (?, ?, ?, ?)",
+                (
+                    tournInfo["url"],
+                    tournInfo["name"],
+                    str(tournInfo["date"]),
+                    tournInfo["format"],
+                ),
+            ).rowcount
+            if inserted == 0:
+                return False
+            con.executemany(
+                "INSERT INTO deck_rows VALUES (?, ?, ?, ?, ?)",
+                deckStore.deckRows(tournInfo["url"], decksDict),
+            )
+            con.executemany(
+                "INSERT INTO deck_ranks VALUES (?, ?, ?)",
+                [
+                    (*deckId, rank)
+                    for deckId, rank in mtgoScrape.deckRanks(
+                        {tournInfo["url"]: decksDict}
+                    ).items()
+                ],
+            )
+        return True
+
+    def ingest(tournInfoList: list, workers: int = 1, path: str = deckStorePath):
+        """Fetches and stores every tournament in tournInfoList that is not stored
+        or given up on yet.
+
+        Returns:
+            list: The tournament dicts that were newly written
+        """
+        con = deckStore.connect(path)
+        stored = deckStore.storedUrls(con) | deckStore.abandonedUrls(con)
+        newTourns = [x for x in tournInfoList if x["url"] not in stored]
+        decksByUrl = mtgoScrape.getDecksFromUrls([x["url"] for x in newTourns], workers)
+        written = [
+            x
+            for x in newTourns
+            if deckStore.writeTournament(con, x, decksByUrl[x["url"]])
+        ]
+        con.close()
+        logging.info(f"Stored {len(written)} new tournament(s) in {path}.")
+        return written
+
+    def tournInfoFromFilename(filename: str):
+        """Rebuilds a tournament dict from a cached JSON name like 'pioneer-challenge-32-2025-01-0412345678.json'."""
+        stem = os.path.splitext(os.path.basename(filename))[0]
+        match = re.match(r"^([a-z]+)-.*?(\d{4}-\d{2}-\d{2})", stem)
+        if match is None:
+            return None
+        return {
+            "name": stem,
+            "date": dt.date.fromisoformat(match.group(2)),
+            "url": f"/decklist/{stem}",
+            "format": match.group(1),
+        }
+
+    def migrateJsonCache(cacheDir: str = decklistCacheDir, path: str = deckStorePath):
+        """One-shot import of the per-tournament JSON files into the store.
+
+        Returns:
+            int: Number of tournaments written
+        """
+        con = deckStore.connect(path)
+        written = 0
+        for filename in sorted(os.listdir(cacheDir)):
+            tournInfo = deckStore.tournInfoFromFilename(filename)
+            if not filename.endswith(".json") or tournInfo is None:
+                logging.warning(f"Skipping {filename}, cannot infer format and date.")
+                continue
+            with open(os.path.join(cacheDir, filename), "r") as f:
+                decksDict = json.load(f)
+            written += deckStore.writeTournament(con, tournInfo, decksDict)
+        con.close()
+        logging.info(f"Migrated {written} tournament(s) from {cacheDir} to {path}.")
+        return written
+
+    def watermark(con, format: str):
+        """Date up to which the last ingestion run stored, or gave up on, every listed
+        tournament of a format, or None.
+        """
+        row = con.execute(
+            "SELECT date FROM watermarks WHERE format = ?", (format,)
+        ).fetchone()
+        return None if row is None else dt.date.fromisoformat(row[0])
+
+    def setWatermark(con, format: str, date):
+        with con:
+            con.execute(
+                "INSERT INTO watermarks VALUES (?, ?) "
+                "ON CONFLICT (format) DO UPDATE SET date = excluded.date",
+                (format, str(date)),
+            )
+
+    def unclassifiedUrls(con, format: str):
+        """Stored tournaments of a format whose decks have no summaries yet."""
+        rows = con.execute(
+            """
+            SELECT t.url FROM tournaments t
+            WHERE t.format = ? AND NOT EXISTS (
+                SELECT 1 FROM deck_summaries s WHERE s.url = t.url
+            )
+            ORDER BY t.date, t.url
+            """,
+            (format,),
+        )
+        return [x[0] for x in rows]
+
+    def writeSummaries(con, summaryDf):
+        """Stores classifyDecks output, replacing any earlier summary of the same decks."""
+        rows = [
+            (
+                url,
+                deck,
+                row["Colour"],
+                json.dumps(list(row["Key Cards"])),
+                int(row["Land Count"]),
+                float(row["Avg CMC"]),
+                row["Archetype"],
+                row["Deck Name"],
+            )
+            for (url, deck), row in summaryDf.iterrows()
+        ]
+        with con:
+            con.executemany(
+                "INSERT OR REPLACE INTO deck_summaries VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                rows,
+            )
+        return len(rows)
+
+    def readSummaries(
+        formats=None, startDate=None, endDate=None, path: str = deckStorePath
+    ):
+        """Reads stored deck summaries in the classifyDecks layout, with the
+        tournament's Format and Date added, and each deck's Rank where its
+        tournament page had standings.
+        """
+        where, params = deckStore.tournamentFilter(formats, startDate, endDate)
+        query = """
+            SELECT s.url AS "Deck URL", s.deck AS "Deck", t.format AS "Format",
+                   t.date AS "Date", s.colour AS "Colour", s.key_cards AS "Key Cards",
+                   s.land_count AS "Land Count", s.avg_cmc AS "Avg CMC",
+                   s.archetype AS "Archetype", s.deck_name AS "Deck Name",
+                   r.rank AS "Rank"
+            FROM deck_summaries s JOIN tournaments t ON t.url = s.url
+            LEFT JOIN deck_ranks r ON r.url = s.url AND r.deck = s.deck
+        """
+        if where:
+            query += " WHERE " + " AND ".join(where)
+        con = deckStore.connect(path)
+        outDf = pd.read_sql_query(query, con, params=params)
+        con.close()
+        outDf["Date"] = pd.to_datetime(outDf["Date"]).dt.date
+        outDf["Key Cards"] = outDf["Key Cards"].map(json.loads)
+        return outDf.set_index(["Deck URL", "Deck"]).sort_index()
+
+    def tournamentFilter(formats=None, startDate=None, endDate=None, urls=None):
+        """SQL conditions on the tournaments table (aliased t) and their parameters."""
+        where = []
+        params = []
+        if isinstance(formats, str):
+            formats = [formats]
+        if formats:
+            where.append(f"t.format IN ({', '.join('?' * len(formats))})")
+            params += list(formats)
+        if startDate is not None:
+            where.append("t.date >= ?")
+            params.append(pd.Timestamp(startDate).date().isoformat())
+        if endDate is not None:
+            where.append("t.date <= ?")
+            params.append(pd.Timestamp(endDate).date().isoformat())
+        if urls is not None:
+            where.append(f"t.url IN ({', '.join('?' * len(urls))})")
+            params += list(urls)
+        return where, params
+
+    def read(
+        formats=None,
+        startDate=None,
+        endDate=None,
+        path: str = deckStorePath,
+        urls=None,
+    ):
+        """Reads stored decks, filtering by format and date inside SQLite.
+
+        Args:
+            formats (str | list, optional): Format(s) to keep. Defaults to all.
+            startDate (date, optional): First tournament date to keep (inclusive)
+            endDate (date, optional): Last tournament date to keep (inclusive)
+            urls (list, optional): Tournament URLs to keep. Defaults to all.
+
+        Returns:
+            DataFrame: Same shape as getDeckListsFromUrlList, indexed by Deck URL, Deck, Main/Side, Card Name
+        """
+        where, params = deckStore.tournamentFilter(formats, startDate, endDate, urls)
+        query = """
+            SELECT r.url AS "Deck URL", r.deck AS "Deck", r.main_side AS "Main/Side",
+                   r.card AS "Card Name", r.quantity AS "Quantity"
+            FROM deck_rows r JOIN tournaments t ON t.url = r.url
+        """
+        if where:
+            query += " WHERE " + " AND ".join(where)
+        con = deckStore.connect(path)
+        outDf = pd.read_sql_query(query, con, params=params)
+        con.close()
+        outDf = outDf.groupby(
+            ["Deck URL", "Deck", "Main/Side", "Card Name"], sort=True
+        )[["Quantity"]].sum()
+        outDf["Card ID"] = cardNames.cardIds(outDf.index.get_level_values("Card Name"))
+        return outDf
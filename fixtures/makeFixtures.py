@@ -0,0 +1,297 @@
+"""Builds the frozen corpus the benchmark suite runs on.
+
+The corpus is synthetic but in the exact formats the scraper reads:
+
+    scryfall-oracle-cards.json    oracle in the Scryfall bulk file format
+    archetypes/<format>.json      archetype rules for the fixture key cards
+    decklists/<format>-<YYYY>-<MM>.html
+                                  mtgo.com month index pages
+    MTGO Decklists Scraped/       tournament JSONs, as saved by saveDecks
+    pages/<tournament>.html       the first tournament page of each format,
+                                  embedding window.MTGO.decklists.data
+
+Apart from the five basic lands, every card is invented and named "Fixture ..."
+so its colours, costs and types are never mistaken for oracle facts. Each
+archetype is built around its own fixture key cards, so classification, the
+queries and the Jaccard stages see realistic clusters. An archetype's filler,
+sideboard and basics share the colours of its key cards. The output is
+deterministic; rerun only when the formats above change.
+
+Usage:
+    python fixtures/makeFixtures.py
+"""
+
+import json
+import os
+import random
+import shutil
+
+fixturesDir = os.path.dirname(os.path.abspath(__file__))
+
+formats = ["pioneer", "modern", "legacy"]
+year, month = 2025, 1
+tournamentDays = [4, 6, 11, 13, 18, 20, 25, 27]
+decksPerTournament = 32
+archetypesPerFormat = 10
+fillerCount = 400
+
+basics = {"W": "Plains", "U": "Island", "B": "Swamp", "R": "Mountain", "G": "Forest"}
+
+
+def signatures(format: str):
+    """Key cards that define each archetype of a format. Pioneer archetypes have
+    one, as with its key card list, and every third archetype of the other
+    formats needs two.
+    """
+    name = format.capitalize()
+    return [
+        [f"Fixture {name} Key {i}"]
+        + ([f"Fixture {name} Key {i}b"] if format != "pioneer" and i % 3 == 0 else [])
+        for i in range(archetypesPerFormat)
+    ]
+
+
+def archetypeRules(format: str):
+    """Rules in the archetypes/<format>.json layout that classify the fixture decks."""
+    return {
+        "format": format,
+        "fallback": {"aggroBelow": 22, "controlAbove": 26},
+        "rules": [
+            {
+                "archetype": f"Fixture {format.capitalize()} {i}",
+                "required": {x: 2 for x in signature},
+            }
+            for i, signature in enumerate(signatures(format))
+        ],
+    }
+
+
+def oracleCard(rng, name: str):
+    colour = rng.choice("WUBRG")
+    cmc = rng.randint(1, 5)
+    card = {
+        "object": "card",
+        "name": name,
+        "layout": "normal",
+        "set_type": "expansion",
+        "mana_cost": f"{{{cmc - 1}}}{{{colour}}}" if cmc > 1 else f"{{{colour}}}",
+        "cmc": float(cmc),
+        "type_line": rng.choice(["Creature — Human", "Instant", "Sorcery"]),
+        "oracle_text": "",
+        "colors": [colour],
+        "color_identity": [colour],
+        "set": "fix",
+        "rarity": rng.choice(["common", "uncommon", "rare", "mythic"]),
+    }
+    if card["type_line"].startswith("Creature"):
+        card["power"] = str(rng.randint(1, 4))
+        card["toughness"] = str(rng.randint(1, 4))
+    return card
+
+
+def doubleFacedCard(rng, front: str, back: str):
+    card = oracleCard(rng, f"{front} // {back}")
+    card["layout"] = "transform"
+    card["card_faces"] = [
+        {
+            "name": front,
+            "mana_cost": card.pop("mana_cost"),
+            "type_line": "Creature — Human Werewolf",
+            "oracle_text": "",
+            "power": "2",
+            "toughness": "2",
+        },
+        {
+            "name": back,
+            "mana_cost": "",
+            "type_line": "Creature — Werewolf",
+            "oracle_text": "",
+            "power": "4",
+            "toughness": "4",
+        },
+    ]
+    del card["type_line"], card["colors"]
+    return card
+
+
+def landCard(name: str, colour=None):
+    return {
+        "object": "card",
+        "name": name,
+        "layout": "normal",
+        "set_type": "expansion",
+        "mana_cost": "",
+        "cmc": 0.0,
+        "type_line": f"Basic Land — {name}" if colour else "Land",
+        "oracle_text": "",
+        "colors": [],
+        "color_identity": [colour] if colour else [],
+        "set": "fix",
+        "rarity": "common",
+    }
+
+
+def buildOracle(rng, keyCards: list):
+    cards = [landCard(name, colour) for colour, name in basics.items()]
+    cards += [oracleCard(rng, x) for x in keyCards]
+    for i in range(fillerCount):
+        if i % 20 == 0:
+            cards.append(
+                doubleFacedCard(rng, f"Fixture Front {i}", f"Fixture Back {i}")
+            )
+        elif i % 10 == 0:
+            cards.append(landCard(f"Fixture Land {i}"))
+        else:
+            cards.append(oracleCard(rng, f"Fixture Card {i}"))
+    return cards
+
+
+def deckText(quantities: dict):
+    return "\n".join(f"{v} {k}" for k, v in quantities.items())
+
+
+def buildDeck(rng, signature: list, core: list, pool: list, lands: list):
+    main = {x: 4 for x in signature}
+    for card in core:
+        if sum(main.values()) >= 36:
+            break
+        main[card] = rng.choice([2, 3, 4, 4])
+    while sum(main.values()) < 36:
+        card = rng.choice(pool)
+        main[card] = main.get(card, 0) + 1
+    for i in range(24):
+        land = lands[i % len(lands)]
+        main[land] = main.get(land, 0) + 1
+    side = {}
+    while sum(side.values()) < 15:
+        card = rng.choice(pool)
+        side[card] = side.get(card, 0) + 1
+    return {"main": deckText(main), "side": deckText(side)}
+
+
+def tournamentPage(format: str, eventId: int, decks: dict):
+    """A tournament results page with its decklists in the page data, as mtgo.com
+    serves it. Cards can be listed over several entries, one per printing, and the
+    standings hold each deck's "rank".
+    """
+
+    def entries(text: str, sideboard: bool):
+        cards = []
+        for line in text.split("\n"):
+            qty, name = line.split(" ", 1)
+            printings = [int(qty)] if int(qty) < 4 else [int(qty) - 2, 2]
+            cards += [
+                {
+                    "docid": str(len(cards) + x),
+                    "qty": str(y),
+                    "sideboard": str(sideboard).lower(),
+                    "card_attributes": {"card_name": name},
+                }
+                for x, y in enumerate(printings)
+            ]
+        return cards
+
+    ranks = [x["rank"] for x in decks.values()]
+    loginIds = [str(eventId * 100 + i) for i in range(len(decks))]
+    data = {
+        "event_id": str(eventId),
+        "description": f"{format.capitalize()} Challenge 32",
+        "type": "Challenge",
+        "decklists": [
+            {
+                "loginid": loginId,
+                "player": f"Player{loginId}",
+                "main_deck": entries(deck["main"], False),
+                "sideboard_deck": entries(deck["side"], True),
+            }
+            for loginId, deck in zip(loginIds, decks.values())
+        ],
+        "standings": sorted(
+            (
+                {"loginid": x, "login_name": f"Player{x}", "rank": str(y)}
+                for x, y in zip(loginIds, ranks)
+            ),
+            key=lambda x: int(x["rank"]),
+        ),
+    }
+    return (
+        "<html><head><script>\nwindow.MTGO = window.MTGO || {};\n"
+        "window.MTGO.decklists = window.MTGO.decklists || {};\n"
+        f"window.MTGO.decklists.data = {json.dumps(data)};\n"
+        '</script></head><body><div id="decklists"></div></body></html>\n'
+    )
+
+
+def monthPage(format: str, tournaments: list):
+    links = "\n".join(
+        f'<li><a class="decklists-link" href="{url}"><h3>{format.capitalize()} '
+        f'Challenge 32</h3><time datetime="{date}T00:00:00Z">{date}</time></a></li>'
+        for url, date in tournaments
+    )
+    return f"<html><body><ul>\n{links}\n</ul></body></html>\n"
+
+
+def main():
+    rng = random.Random(2025)
+    keyCards = sorted({x for f in formats for s in signatures(f) for x in s})
+    cards = buildOracle(rng, keyCards)
+    spells = [
+        x["card_faces"][0]["name"] if "card_faces" in x else x["name"] for x in cards
+    ]
+    spells = [x for x in spells if "Land" not in x and x not in basics.values()]
+    spells = [x for x in spells if x not in keyCards]
+    colours = {
+        x["card_faces"][0]["name"] if "card_faces" in x else x["name"]: x[
+            "color_identity"
+        ]
+        for x in cards
+    }
+    fixtureLands = [x["name"] for x in cards if "Fixture Land" in x["name"]]
+
+    deckDir = os.path.join(fixturesDir, "MTGO Decklists Scraped")
+    pageDir = os.path.join(fixturesDir, "decklists")
+    tournamentDir = os.path.join(fixturesDir, "pages")
+    rulesDir = os.path.join(fixturesDir, "archetypes")
+    for directory in [deckDir, pageDir, tournamentDir, rulesDir]:
+        shutil.rmtree(directory, ignore_errors=True)
+        os.makedirs(directory)
+    eventId = 12700000
+    for format in formats:
+        with open(os.path.join(rulesDir, f"{format}.json"), "w") as f:
+            json.dump(archetypeRules(format), f, indent=4)
+        archetypes = []
+        for signature in signatures(format):
+            # Core cards, filler and basics all share the key cards' colours
+            archetypeColours = {c for x in signature for c in colours[x]}
+            pool = [x for x in spells if set(colours[x]) <= archetypeColours]
+            deckLands = [basics[x] for x in "WUBRG" if x in archetypeColours]
+            deckLands.append(rng.choice(fixtureLands))
+            archetypes.append((signature, rng.sample(pool, 12), pool, deckLands))
+        tournaments = []
+        for day in tournamentDays:
+            eventId += 1
+            date = f"{year}-{month:02d}-{day:02d}"
+            stem = f"{format}-challenge-32-{date}{eventId}"
+            decks = {}
+            for i in range(decksPerTournament):
+                signature, core, pool, deckLands = rng.choice(archetypes)
+                decks[f"Deck {i}"] = buildDeck(rng, signature, core, pool, deckLands)
+            # Challenges have standings, which are not in decklist order
+            ranks = list(range(1, decksPerTournament + 1))
+            random.Random(eventId).shuffle(ranks)
+            for deck, rank in zip(decks.values(), ranks):
+                deck["rank"] = rank
+            with open(os.path.join(deckDir, f"{stem}.json"), "w") as f:
+                json.dump(decks, f)
+            if not tournaments:
+                with open(os.path.join(tournamentDir, f"{stem}.html"), "w") as f:
+                    f.write(tournamentPage(format, eventId, decks))
+            tournaments.append((f"/decklist/{stem}", date))
+        with open(os.path.join(pageDir, f"{format}-{year}-{month:02d}.html"), "w") as f:
+            f.write(monthPage(format, tournaments))
+    with open(os.path.join(fixturesDir, "scryfall-oracle-cards.json"), "w") as f:
+        json.dump(cards, f)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,219 @@
+## Imports
+
+import contextlib
+import cProfile
+import datetime as dt
+import io
+import json
+import logging
+import os
+import pstats
+import sys
+import threading
+import time
+import tracemalloc
+
+## Run Reports
+
+# Comma separated captures to add to each run: "cprofile", "tracemalloc"
+profileCaptures = [
+    x.strip() for x in os.environ.get("MTGO_PROFILE", "").split(",") if x.strip()
+]
+# Directory run reports are written to. Reports are only kept in memory if unset.
+reportDir = os.environ.get("MTGO_REPORT_DIR")
+
+
+class instrumentation:
+    """Timers and counters for the pipeline stages, collected into one JSON
+    report per run.
+
+    Stages are wrapped with the `timed` decorator or context manager and events
+    are tallied with `count`. Both are thread-safe and cheap enough to leave on.
+    A run is the outermost `run` block. When it ends, its report is kept in
+    `lastReport`, logged in one line, and written under `reportDir` if that is
+    set. With MTGO_PROFILE, each run also captures cProfile and/or tracemalloc.
+    """
+
+    timers = {}
+    counters = {}
+    lastReport = None
+
+    _lock = threading.Lock()
+    _activeRun = None
+
+    def reset():
+        with instrumentation._lock:
+            instrumentation.timers = {}
+            instrumentation.counters = {}
+
+    def record(name: str, seconds: float):
+        with instrumentation._lock:
+            timer = instrumentation.timers.setdefault(
+                name, {"calls": 0, "seconds": 0.0, "max": 0.0}
+            )
+            timer["calls"] += 1
+            timer["seconds"] += seconds
+            timer["max"] = max(timer["max"], seconds)
+
+    def count(name: str, n: int = 1):
+        with instrumentation._lock:
+            instrumentation.counters[name] = instrumentation.counters.get(name, 0) + n
+
+    def collected():
+        """The timers and counters so far, e.g. to send back from a pool worker."""
+        with instrumentation._lock:
+            return (
+                {k: dict(v) for k, v in instrumentation.timers.items()},
+                dict(instrumentation.counters),
+            )
+
+    def merge(timers: dict, counters: dict):
+        """Adds timers and counters collected in another process to this one's."""
+        with instrumentation._lock:
+            for name, other in timers.items():
+                timer = instrumentation.timers.setdefault(
+                    name, {"calls": 0, "seconds": 0.0, "max": 0.0}
+                )
+                timer["calls"] += other["calls"]
+                timer["seconds"] += other["seconds"]
+                timer["max"] = max(timer["max"], other["max"])
+            for name, n in counters.items():
+                instrumentation.counters[name] = (
+                    instrumentation.counters.get(name, 0) + n
+                )
+
+    def timed(name: str):
+        """Times a stage, as a decorator or a context manager:
+
+        @instrumentation.timed("oracle.bulk")
+        def bulk(...): ...
+
+        with instrumentation.timed("classifyDecks"): ...
+        """
+        return _Timer(name)
+
+    @contextlib.contextmanager
+    def run(name: str):
+        """Collects everything timed and counted inside the block into one report.
+
+        Nested runs are timed as stages of the outermost one.
+        """
+        with instrumentation._lock:
+            outermost = instrumentation._activeRun is None
+            if outermost:
+                instrumentation._activeRun = name
+        if not outermost:
+            with instrumentation.timed(name):
+                yield
+            return
+        instrumentation.reset()
+        profiler = cProfile.Profile() if "cprofile" in profileCaptures else None
+        tracing = "tracemalloc" in profileCaptures and not tracemalloc.is_tracing()
+        if tracing:
+            tracemalloc.start()
+        started = dt.datetime.now()
+        start = time.perf_counter()
+        if profiler is not None:
+            profiler.enable()
+        error = None
+        try:
+            yield
+        except BaseException as e:
+            error = repr(e)
+            raise
+        finally:
+            if profiler is not None:
+                profiler.disable()
+            seconds = time.perf_counter() - start
+            report = instrumentation.report(name, started, seconds)
+            report["error"] = error
+            if profiler is not None:
+                report["cprofile"] = instrumentation.profileSummary(profiler)
+            if tracing:
+                report["tracemalloc"] = instrumentation.memorySummary()
+                tracemalloc.stop()
+            instrumentation.lastReport = report
+            with instrumentation._lock:
+                instrumentation._activeRun = None
+            instrumentation.emit(report, profiler)
+
+    def report(name: str, started, seconds: float):
+        with instrumentation._lock:
+            return {
+                "run": name,
+                "started": started.isoformat(timespec="seconds"),
+                "seconds": seconds,
+                "pid": os.getpid(),
+                "python": sys.version.split()[0],
+                "timers": {k: dict(v) for k, v in instrumentation.timers.items()},
+                "counters": dict(instrumentation.counters),
+            }
+
+    def profileSummary(profiler, top: int = 25):
+        """The `top` functions by cumulative time."""
+        stats = pstats.Stats(profiler, stream=io.StringIO())
+        rows = []
+        for (path, line, func), values in stats.stats.items():
+            calls, _, ownTime, cumTime, _ = values
+            rows.append(
+                {
+                    "function": f"{os.path.basename(path)}:{line}({func})",
+                    "calls": calls,
+                    "ownSeconds": ownTime,
+                    "cumulativeSeconds": cumTime,
+                }
+            )
+        rows.sort(key=lambda x: x["cumulativeSeconds"], reverse=True)
+        return rows[:top]
+
+    def memorySummary(top: int = 25):
+        """Peak traced memory and the `top` allocation sites still held."""
+        current, peak = tracemalloc.get_traced_memory()
+        snapshot = tracemalloc.take_snapshot()
+        return {
+            "currentBytes": current,
+            "peakBytes": peak,
+            "top": [
+                {"where": str(x.traceback), "bytes": x.size, "blocks": x.count}
+                for x in snapshot.statistics("lineno")[:top]
+            ],
+        }
+
+    def emit(report: dict, profiler=None):
+        stages = sorted(
+            report["timers"].items(), key=lambda x: x[1]["seconds"], reverse=True
+        )
+        summary = ", ".join(f"{k} {v['seconds']:.2f}s" for k, v in stages[:5])
+        logging.info(f"{report['run']} took {report['seconds']:.2f}s: {summary}")
+        if reportDir is None:
+            return
+        os.makedirs(reportDir, exist_ok=True)
+        stem = f"{report['run']}-{report['started'].replace(':', '')}-{report['pid']}"
+        path = os.path.join(reportDir, f"{stem}.json")
+        with open(path, "w") as f:
+            json.dump(report, f, indent=2)
+        if profiler is not None:
+            profiler.dump_stats(os.path.join(reportDir, f"{stem}.prof"))
+        logging.info(f"Run report written to {path}.")
+
+
+class _Timer(contextlib.ContextDecorator):
+    # As a decorator the same instance serves every call, so start times are
+    # kept per thread and per nesting level.
+
+    def __init__(self, name: str):
+        self.name = name
+        self._starts = threading.local()
+
+    def __enter__(self):
+        stack = getattr(self._starts, "stack", None)
+        if stack is None:
+            stack = self._starts.stack = []
+        stack.append(time.perf_counter())
+        return self
+
+    def __exit__(self, *exc):
+        instrumentation.record(
+            self.name, time.perf_counter() - self._starts.stack.pop()
+        )
+        return False
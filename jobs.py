@@ -0,0 +1,156 @@
+## Imports
+
+import contextlib
+import logging
+import queue
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pandas as pd
+
+from deckStore import deckStore, deckStorePath
+from metagame import Metagame
+from mtgoScraper import mtgoScrape
+from pipeline import pipeline
+
+## Jobs
+
+
+class JobCancelled(Exception):
+    """Raised inside a job at its next checkpoint after cancel() was called."""
+
+
+class Job:
+    """A unit of background work and the event queue it reports through.
+
+    The job function gets the Job as its first argument. It reports with
+    progress() and stage(), and cancellation takes effect at its next
+    checkpoint. The front end reads `events` without blocking. Each event
+    is a tuple whose first item is its kind:
+
+        ("progress", message, fraction or None)
+        ("stage", name, seconds)
+        ("done", result)
+        ("cancelled",)
+        ("error", message)
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        self.events = queue.Queue()
+        self.future = None
+        self._cancel = threading.Event()
+
+    def cancel(self):
+        self._cancel.set()
+
+    @property
+    def cancelled(self):
+        return self._cancel.is_set()
+
+    def checkCancelled(self):
+        if self._cancel.is_set():
+            raise JobCancelled(self.name)
+
+    def progress(self, message: str, fraction=None):
+        self.events.put(("progress", message, fraction))
+
+    @contextlib.contextmanager
+    def stage(self, name: str):
+        """Checkpoint, then time the block and report it as a stage."""
+        self.checkCancelled()
+        self.progress(f"{name}...")
+        start = time.perf_counter()
+        yield
+        self.events.put(("stage", name, time.perf_counter() - start))
+
+    def finished(self):
+        return self.future is not None and self.future.done()
+
+
+class JobRunner:
+    """Runs jobs on background threads so the caller, e.g. a Tk mainloop, never
+    blocks on scraping or analysis.
+    """
+
+    def __init__(self, workers: int = 1):
+        self._executor = ThreadPoolExecutor(
+            max_workers=workers, thread_name_prefix="job"
+        )
+        self._jobs = []
+
+    def submit(self, name: str, func, *args, **kwargs):
+        """Queues func(job, *args, **kwargs) and returns its Job."""
+        job = Job(name)
+        job.future = self._executor.submit(self._run, job, func, args, kwargs)
+        self._jobs.append(job)
+        return job
+
+    def _run(self, job, func, args, kwargs):
+        try:
+            job.events.put(("done", func(job, *args, **kwargs)))
+        except JobCancelled:
+            job.events.put(("cancelled",))
+        except Exception as e:
+            logging.exception(f"Job {job.name} failed.")
+            job.events.put(("error", f"{type(e).__name__}: {e}"))
+
+    def shutdown(self, cancel: bool = True):
+        if cancel:
+            for job in self._jobs:
+                job.cancel()
+        self._executor.shutdown(wait=False, cancel_futures=cancel)
+
+
+## Job Functions
+
+# Tournaments fetched between cancellation checks
+ingestBatchSize = 8
+
+
+def metagameJob(
+    job,
+    format: str,
+    startDate,
+    endDate,
+    workers: int = 4,
+    path: str = deckStorePath,
+):
+    """Lists, stores, classifies and summarises a format's tournaments in a date range.
+
+    Tournaments and summaries already in the deck store are reused, so running a
+    range again only lists it and reads the store.
+
+    Returns:
+        DataFrame: Metagame.placement of the range, empty if it has no decks
+    """
+    with job.stage("Listing tournaments"):
+        tourns = mtgoScrape.formatDeckListRange(format, startDate, endDate)
+    con = deckStore.connect(path)
+    try:
+        stored = deckStore.storedUrls(con, format)
+        newTourns = [x for x in tourns if x["url"] not in stored]
+        job.progress(f"{len(tourns)} tournaments, {len(newTourns)} not stored yet", 0.0)
+        with job.stage("Fetching decklists"):
+            for i in range(0, len(newTourns), ingestBatchSize):
+                job.checkCancelled()
+                deckStore.ingest(newTourns[i : i + ingestBatchSize], workers, path)
+                done = min(i + ingestBatchSize, len(newTourns))
+                job.progress(
+                    f"Fetched {done}/{len(newTourns)} tournaments",
+                    done / len(newTourns),
+                )
+        with job.stage("Classifying decks"):
+            pipeline.classifyStored(con, format, path)
+    finally:
+        con.close()
+    with job.stage("Summarising metagame"):
+        summaryDf = deckStore.readSummaries(format, startDate, endDate, path)
+        if len(summaryDf) == 0:
+            return pd.DataFrame(
+                columns=["Decks", "Share", "Top 8 Rate", "Placement Score"]
+            )
+        return Metagame(Metagame.aggregate(summaryDf)).placement(
+            format, startDate, endDate
+        )
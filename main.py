@@ -1,10 +1,16 @@
-import mtgoScraper as ms
+import math
+import queue
 import tkinter as tk
 from tkinter import ttk
 from tkcalendar import DateEntry
 from ttkthemes import ThemedTk
 import datetime as dt
 
+from jobs import JobRunner, metagameJob
+
+# How often the GUI checks a running job for events, in milliseconds
+pollInterval = 100
+
 
 # Setup Tkinter
 def setupTkinter():
@@ -36,6 +42,124 @@ def setupTkinter():
     formatMenu = ttk.OptionMenu(formatFrm, formatVar, formatOptions[0], *formatOptions)
     formatMenu.grid(row=0, column=1)
 
+    # Job Frame
+    jobFrm = ttk.Frame(root, padding=10, style="Custom.TFrame")
+    jobFrm.grid(column=0, row=1, columnspan=2, sticky="ew")
+    jobFrm.columnconfigure(2, weight=1)
+    runButton = ttk.Button(jobFrm, text="Run")
+    runButton.grid(column=0, row=0)
+    cancelButton = ttk.Button(jobFrm, text="Cancel", state="disabled")
+    cancelButton.grid(column=1, row=0, padx=5)
+    progressBar = ttk.Progressbar(jobFrm, mode="indeterminate", length=300)
+    progressBar.grid(column=2, row=0, sticky="ew")
+    statusVar = tk.StringVar(value="Ready")
+    ttk.Label(jobFrm, textvariable=statusVar).grid(
+        column=0, row=1, columnspan=3, sticky="w", pady=5
+    )
+    timingsVar = tk.StringVar()
+    ttk.Label(jobFrm, textvariable=timingsVar, justify="left").grid(
+        column=0, row=2, columnspan=3, sticky="w"
+    )
+
+    # Results Frame
+    resultsFrm = ttk.Frame(root, padding=10, style="Custom.TFrame")
+    resultsFrm.grid(column=0, row=2, columnspan=2, sticky="nsew")
+    root.rowconfigure(2, weight=1)
+    resultColumns = ("Deck", "Decks", "Share", "Top 8 Rate", "Placement Score")
+    resultsTree = ttk.Treeview(resultsFrm, columns=resultColumns, show="headings")
+    for column in resultColumns:
+        resultsTree.heading(column, text=column)
+        resultsTree.column(column, width=220 if column == "Deck" else 110)
+    resultsTree.pack(fill="both", expand=True)
+
+    runner = JobRunner()
+    current = {"job": None, "timings": []}
+
+    def formatRate(value, spec):
+        # Archetypes only seen in leagues have no placed decks
+        return "-" if math.isnan(value) else format(value, spec)
+
+    def showResults(placementDf):
+        resultsTree.delete(*resultsTree.get_children())
+        for deckName, row in placementDf.iterrows():
+            resultsTree.insert(
+                "",
+                "end",
+                values=(
+                    deckName,
+                    int(row["Decks"]),
+                    f"{row['Share']:.1%}",
+                    formatRate(row["Top 8 Rate"], ".1%"),
+                    formatRate(row["Placement Score"], ".2f"),
+                ),
+            )
+
+    def finish(message):
+        progressBar.stop()
+        progressBar.configure(mode="determinate", value=0)
+        statusVar.set(message)
+        runButton.configure(state="normal")
+        cancelButton.configure(state="disabled")
+        current["job"] = None
+
+    def poll():
+        job = current["job"]
+        if job is None:
+            return
+        while True:
+            try:
+                event = job.events.get_nowait()
+            except queue.Empty:
+                break
+            if event[0] == "progress":
+                statusVar.set(event[1])
+                if event[2] is not None:
+                    progressBar.stop()
+                    progressBar.configure(mode="determinate", value=event[2] * 100)
+            elif event[0] == "stage":
+                current["timings"].append(f"{event[1]}: {event[2]:.1f}s")
+                timingsVar.set("\n".join(current["timings"]))
+            elif event[0] == "done":
+                showResults(event[1])
+                finish(f"Done: {len(event[1])} archetypes")
+                return
+            elif event[0] == "cancelled":
+                finish("Cancelled")
+                return
+            elif event[0] == "error":
+                finish(f"Failed: {event[1]}")
+                return
+        root.after(pollInterval, poll)
+
+    def run():
+        current["timings"] = []
+        timingsVar.set("")
+        runButton.configure(state="disabled")
+        cancelButton.configure(state="normal")
+        progressBar.configure(mode="indeterminate")
+        progressBar.start()
+        current["job"] = runner.submit(
+            "metagame",
+            metagameJob,
+            formatVar.get().lower(),
+            startDate.get_date(),
+            endDate.get_date(),
+        )
+        root.after(pollInterval, poll)
+
+    def cancel():
+        if current["job"] is not None:
+            current["job"].cancel()
+            statusVar.set("Cancelling after the current step...")
+
+    def close():
+        runner.shutdown(cancel=True)
+        root.destroy()
+
+    runButton.configure(command=run)
+    cancelButton.configure(command=cancel)
+    root.protocol("WM_DELETE_WINDOW", close)
+
     root.mainloop()
 
 
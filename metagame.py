@@ -0,0 +1,236 @@
+## Imports
+
+import numpy as np
+import pandas as pd
+
+from deckStore import deckStore, deckStorePath
+
+## Metagame
+
+
+class Metagame:
+    """Per-day, per-format archetype counts, with rolling share, trend and
+    placement queries answered from those counts alone.
+
+    The daily counts come from the deck store's summaries or from classified Deck
+    objects. For each (format, label) queried they become one cumulative
+    day x label grid, so any window is a difference of two rows. A year of daily
+    rolling snapshots is one array subtraction.
+
+    Placement is the deck's rank in the standings of its tournament page. When the
+    page had no standings data, Challenges fall back to the deck's position on the
+    page ("Deck 0" is first), which follows the final standings. Leagues have no
+    standings, so their decks are left unplaced. Placement is the win proxy behind
+    the "Top 8 Rate" and "Placement Score" columns, which only count placed decks.
+    The score is 1 for first place and 0 for last.
+    """
+
+    countColumns = ["Decks", "Placed", "Top 8", "Score"]
+
+    def __init__(self, dailyDf):
+        """
+        Args:
+            dailyDf (DataFrame): Format, Date, Archetype, Colour, Decks, Placed, Top 8 and Score per row, as from Metagame.aggregate
+        """
+        self.daily = dailyDf
+        self._grids = {}
+
+    def aggregate(deckDf):
+        """Reduces one row per deck to daily counts.
+
+        Args:
+            deckDf (DataFrame): Deck URL, Deck, Format, Date, Archetype and Colour columns, and optionally Rank
+
+        Returns:
+            DataFrame: Decks, Placed, Top 8 and Score summed per (Format, Date, Archetype, Colour)
+        """
+        deckDf = deckDf.reset_index()
+        position = deckDf["Deck"].str.extract(r"(\d+)$")[0].astype(float) + 1
+        position = position.where(~deckDf["Deck URL"].str.contains("-league-"))
+        rank = deckDf.get("Rank", pd.Series(np.nan, index=deckDf.index)).astype(float)
+        # A tournament with any rank from its page is placed by its standings only
+        hasStandings = rank.notna().groupby(deckDf["Deck URL"]).transform("any")
+        place = rank.where(hasStandings, position)
+        entrants = place.groupby(deckDf["Deck URL"]).transform("max")
+        score = 1 - (place - 1) / (entrants - 1).clip(lower=1)
+        deckDf = deckDf.assign(
+            **{
+                "Date": pd.to_datetime(deckDf["Date"]),
+                "Decks": 1,
+                "Placed": place.notna().astype(int),
+                "Top 8": (place <= 8).astype(int),
+                "Score": score.where(entrants > 1, 1.0).where(place.notna(), 0.0),
+            }
+        )
+        return (
+            deckDf.groupby(["Format", "Date", "Archetype", "Colour"])[
+                Metagame.countColumns
+            ]
+            .sum()
+            .reset_index()
+        )
+
+    def fromStore(formats=None, startDate=None, endDate=None, path=deckStorePath):
+        """Builds the metagame from the deck store's summaries, without reading any
+        card rows.
+        """
+        summaryDf = deckStore.readSummaries(formats, startDate, endDate, path)
+        return Metagame(Metagame.aggregate(summaryDf))
+
+    def fromDecks(decks: list, tournInfoList: list, ranks=None):
+        """Builds the metagame from classified Deck objects, e.g. mtgoScrapeMain output.
+
+        Args:
+            decks (list): Deck objects
+            tournInfoList (list): Tournament dicts from formatDeckList, for each deck's date and format
+            ranks (dict, optional): {(Deck URL, Deck): rank}, as from mtgoScrape.deckRanks
+        """
+        tourns = {x["url"]: x for x in tournInfoList}
+        ranks = ranks or {}
+        deckDf = pd.DataFrame(
+            [
+                {
+                    "Deck URL": deck.deckId[0],
+                    "Deck": deck.deckId[1],
+                    "Format": tourns[deck.deckId[0]]["format"],
+                    "Date": tourns[deck.deckId[0]]["date"],
+                    "Archetype": deck.archetype,
+                    "Colour": deck.colour,
+                    "Rank": ranks.get(deck.deckId, np.nan),
+                }
+                for deck in decks
+                if deck.deckId[0] in tourns
+            ]
+        )
+        return Metagame(Metagame.aggregate(deckDf))
+
+    def grid(self, format: str, by: str = "Deck Name"):
+        """Cumulative day x label counts for a format, built once per (format, by).
+
+        Returns:
+            tuple: (DatetimeIndex of days, Index of labels, {column: cumulative array with a leading zero row})
+        """
+        key = (format, by)
+        if key not in self._grids:
+            df = self.daily[self.daily["Format"] == format]
+            if len(df) == 0:
+                raise KeyError(f"No {format} decks in the metagame.")
+            if by == "Deck Name":
+                labels = df["Colour"] + " " + df["Archetype"]
+            else:
+                labels = df[by]
+            days = pd.date_range(df["Date"].min(), df["Date"].max(), freq="D")
+            dayCodes = (df["Date"] - days[0]).dt.days.to_numpy() + 1
+            labelCodes, labelIndex = pd.factorize(labels)
+            cumulative = {}
+            for column in Metagame.countColumns:
+                counts = np.zeros((len(days) + 1, len(labelIndex)))
+                np.add.at(counts, (dayCodes, labelCodes), df[column].to_numpy(float))
+                cumulative[column] = counts.cumsum(axis=0)
+            self._grids[key] = (days, labelIndex, cumulative)
+        return self._grids[key]
+
+    def positions(days, startDate=None, endDate=None):
+        start = 0 if startDate is None else days.searchsorted(pd.Timestamp(startDate))
+        end = len(days)
+        if endDate is not None:
+            end = days.searchsorted(pd.Timestamp(endDate), side="right")
+        return np.arange(start, end)
+
+    def rolling(
+        self,
+        format: str,
+        column: str = "Decks",
+        window: int = 7,
+        startDate=None,
+        endDate=None,
+        by: str = "Deck Name",
+    ):
+        """Sum of a count column over the `window` days ending on each day.
+
+        Returns:
+            DataFrame: One row per day in [startDate, endDate], one column per label
+        """
+        days, labels, cumulative = self.grid(format, by)
+        upper = Metagame.positions(days, startDate, endDate) + 1
+        lower = np.maximum(upper - window, 0)
+        values = cumulative[column][upper] - cumulative[column][lower]
+        return pd.DataFrame(values, index=days[upper - 1], columns=labels)
+
+    def share(
+        self,
+        format: str,
+        window: int = 7,
+        startDate=None,
+        endDate=None,
+        by: str = "Deck Name",
+    ):
+        """Rolling metagame share of each label, one row per day.
+
+        Columns are ordered by share over the whole range, and days with no decks
+        in their window are NaN.
+        """
+        counts = self.rolling(format, "Decks", window, startDate, endDate, by)
+        totals = counts.sum(axis=1)
+        shareDf = counts.div(totals.where(totals > 0), axis=0)
+        order = counts.sum().sort_values(ascending=False, kind="stable").index
+        return shareDf[order]
+
+    def totals(self, format: str, startDate=None, endDate=None, by: str = "Deck Name"):
+        """Count columns summed over [startDate, endDate], one row per label."""
+        days, labels, cumulative = self.grid(format, by)
+        positions = Metagame.positions(days, startDate, endDate)
+        if len(positions) == 0:
+            return pd.DataFrame(0.0, index=labels, columns=Metagame.countColumns)
+        upper, lower = positions[-1] + 1, positions[0]
+        return pd.DataFrame(
+            {x: cumulative[x][upper] - cumulative[x][lower] for x in cumulative},
+            index=labels,
+        )
+
+    def trend(self, format: str, endDate=None, window: int = 7, by: str = "Deck Name"):
+        """Share in the `window` days ending on endDate against the window before it.
+
+        Returns:
+            DataFrame: Decks, Share, Previous Share and Change per label, by Share
+        """
+        days, _, _ = self.grid(format, by)
+        endDate = days[-1] if endDate is None else pd.Timestamp(endDate)
+        current = self.totals(
+            format, endDate - pd.Timedelta(days=window - 1), endDate, by
+        )["Decks"]
+        previousEnd = endDate - pd.Timedelta(days=window)
+        previous = self.totals(
+            format, previousEnd - pd.Timedelta(days=window - 1), previousEnd, by
+        )["Decks"]
+        trendDf = pd.DataFrame(
+            {
+                "Decks": current,
+                "Share": current / max(current.sum(), 1),
+                "Previous Share": previous / max(previous.sum(), 1),
+            }
+        )
+        trendDf["Change"] = trendDf["Share"] - trendDf["Previous Share"]
+        trendDf = trendDf[(trendDf["Decks"] > 0) | (trendDf["Previous Share"] > 0)]
+        return trendDf.sort_values("Share", ascending=False, kind="stable")
+
+    def placement(
+        self, format: str, startDate=None, endDate=None, by: str = "Deck Name"
+    ):
+        """Win proxy per label over a date range.
+
+        Returns:
+            DataFrame: Decks, Share, Top 8 Rate and Placement Score per label, by Decks. The rates are over placed decks, NaN for labels only seen in leagues.
+        """
+        totalsDf = self.totals(format, startDate, endDate, by)
+        totalsDf = totalsDf[totalsDf["Decks"] > 0]
+        placed = totalsDf["Placed"].where(totalsDf["Placed"] > 0)
+        placementDf = pd.DataFrame(
+            {
+                "Decks": totalsDf["Decks"].astype(int),
+                "Share": totalsDf["Decks"] / totalsDf["Decks"].sum(),
+                "Top 8 Rate": totalsDf["Top 8"] / placed,
+                "Placement Score": totalsDf["Score"] / placed,
+            }
+        )
+        return placementDf.sort_values("Decks", ascending=False, kind="stable")
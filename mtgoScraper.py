@@ -1,21 +1,22 @@
 ## Imports
 
+import codecs
 import datetime as dt
+import functools
+import importlib.util
 import json
 import logging
+import multiprocessing
 import os
-import re  # noqa: F401
+import re
+import tempfile
+import threading
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
 
-import bs4
-import matplotlib.pyplot as plt  # noqa: F401
+import numpy as np
 import pandas as pd
 import requests
-from selenium import webdriver
-from selenium.common.exceptions import NoSuchElementException  # noqa: F401
-from selenium.webdriver.chrome.options import Options
-from selenium.webdriver.common.by import By
-from selenium.webdriver.support import expected_conditions as EC  # noqa: F401
-from selenium.webdriver.support.wait import WebDriverWait  # noqa: F401
+from scipy import sparse
 
 from config import (
     mtgColourComboNameDict,
@@ -24,24 +25,226 @@ from config import (
     scryKeepCols,
     standardKeyCardList,
     pauperKeyCardList,
-    modernKeyCardList
+    modernKeyCardList,
+    legacyKeyCardList
 )
+from instrumentation import instrumentation
+from network import network
+
+## Lazy Imports
+
+
+def __getattr__(name):
+    # Plotting and browser scraping are imported on first use, so analysis of
+    # cached data does not load matplotlib or selenium. `plt` is listed in
+    # __all__ so `from mtgoScraper import *` still provides it to the notebooks.
+    if name == "plt":
+        import matplotlib.pyplot as plt
+
+        return plt
+    if name == "BrowserPool":
+        from browser import BrowserPool
+
+        return BrowserPool
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+## Local Caches
+
+decklistCacheDir = "MTGO Decklists Scraped"
+oracleCacheDir = "Scryfall Oracle"
+archetypesDir = os.path.join(os.path.dirname(os.path.abspath(__file__)), "archetypes")
+
+htmlParser = "lxml" if importlib.util.find_spec("lxml") else "html.parser"
+
+# Seconds a cached response is used before it is revalidated with the server.
+# Month index pages stop changing once late tournaments have been posted.
+manifestTtl = 60 * 60
+openMonthTtl = 60 * 60
+closedMonthTtl = 30 * 24 * 60 * 60
+lateListingDays = 7
+
+## Card Names
+
+
+class cardNames:
+    """Interns card names for the whole session.
+
+    Each distinct name is normalized once (split, adventure and double-faced
+    cards go by their front face) and given an integer ID in order of first
+    appearance, so the deck tables, the oracle join and the queries can compare
+    integers instead of strings.
+    """
+
+    _ids = {}
+    _names = []
+    _nameArray = np.empty(0, dtype=object)
+    _lock = threading.Lock()
+
+    @functools.lru_cache(maxsize=None)
+    def normalize(name: str):
+        return name.split(" // ")[0].split("/")[0]
+
+    def cardId(name: str, register: bool = True):
+        """ID of a card name, or -1 if it is unknown and register is False."""
+        name = cardNames.normalize(name)
+        cardId = cardNames._ids.get(name)
+        if cardId is None and register:
+            with cardNames._lock:
+                cardId = cardNames._ids.setdefault(name, len(cardNames._names))
+                if cardId == len(cardNames._names):
+                    cardNames._names.append(name)
+        return -1 if cardId is None else cardId
+
+    def cardIds(names, register: bool = True):
+        """Vectorized cardId: each distinct name in `names` is looked up once.
+
+        Returns:
+            ndarray: int64 IDs, -1 for missing or unregistered names
+        """
+        codes, uniques = pd.factorize(pd.Series(names, dtype=object))
+        ids = np.array(
+            [cardNames.cardId(x, register) for x in uniques] + [-1], dtype=np.int64
+        )
+        return ids[codes]
+
+    def names(cardIds):
+        """Card names for an array of IDs."""
+        if len(cardNames._nameArray) < len(cardNames._names):
+            cardNames._nameArray = np.array(cardNames._names, dtype=object)
+        return cardNames._nameArray[np.asarray(cardIds, dtype=np.int64)]
+
+    def normalizeNames(names):
+        codes, uniques = pd.factorize(pd.Series(names, dtype=object))
+        normalized = np.array(
+            [cardNames.normalize(x) for x in uniques] + [None], dtype=object
+        )
+        return pd.Series(normalized[codes], index=getattr(names, "index", None))
+
 
 ## Bulk Scryfall API
 
 
 class oracle:
-    def bulk():
-        scryfallUrl = "https://api.scryfall.com/bulk-data"
-        response = requests.get(scryfallUrl)
-        bulkDataUrl = response.json()["data"][0]["download_uri"]
-        response2 = requests.get(bulkDataUrl)
-        oracleJson = response2.json()
+    _memo = {}
+    manifestUrl = "https://api.scryfall.com/bulk-data"
+
+    def manifest():
+        """Returns the Scryfall bulk-data entry describing the oracle cards file."""
+        response = network.get(oracle.manifestUrl, ttl=manifestTtl)
+        response.raise_for_status()
+        return response.json()["data"][0]
+
+    @instrumentation.timed("oracle.bulk")
+    def bulk(source=None, stream: bool = False):
+        """Loads the Scryfall oracle bulk file into a DataFrame.
+
+        Args:
+            source (str, optional): Local path or URL of the bulk file. Defaults to the current Scryfall download.
+            stream (bool, optional): Parse the file incrementally, keeping only `bulkKeepFields`. Defaults to False.
+
+        Returns:
+            DataFrame: One row per oracle card
+        """
+        if source is None:
+            source = oracle.manifest()["download_uri"]
+        if stream:
+            return oracle.streamBulk(source)
+        if os.path.exists(source):
+            with open(source, "r", encoding="utf-8") as f:
+                oracleJson = json.load(f)
+        else:
+            response2 = network.get(source)
+            response2.raise_for_status()
+            oracleJson = response2.json()
         oracleDf = pd.json_normalize(oracleJson)
         return oracleDf
 
-    def clean():
-        oracleDf = oracle.bulk()
+    bulkKeepFields = [x for x in scryKeepCols if not x.startswith("back_")] + [
+        "card_faces",
+        "layout",
+        "set_type",
+    ]
+    faceKeepFields = [
+        "name",
+        "mana_cost",
+        "type_line",
+        "oracle_text",
+        "power",
+        "toughness",
+    ]
+
+    # No card comes close to this, so an undecodable tail this long is malformed
+    # and the stream stops instead of buffering the rest of the file.
+    maxCardChars = 1 << 22
+
+    def iterBulkText(source: str, chunkBytes: int = 1 << 20):
+        decoder = codecs.getincrementaldecoder("utf-8")()
+        if os.path.exists(source):
+            with open(source, "rb") as f:
+                for chunk in iter(lambda: f.read(chunkBytes), b""):
+                    yield decoder.decode(chunk)
+        else:
+            for chunk in network.stream(source, chunkBytes):
+                yield decoder.decode(chunk)
+        yield decoder.decode(b"", final=True)
+
+    def iterBulkCards(source: str):
+        """Yields the cards of a bulk file one at a time, trimmed to `bulkKeepFields`, without holding the whole file."""
+        jsonDecoder = json.JSONDecoder()
+        buffer = ""
+        closed = False
+        for text in oracle.iterBulkText(source):
+            buffer += text
+            pos = 0
+            while not closed:
+                while pos < len(buffer) and buffer[pos] in "[, \t\r\n":
+                    pos += 1
+                if pos >= len(buffer):
+                    break
+                if buffer[pos] == "]":
+                    closed = True
+                    pos += 1
+                    break
+                try:
+                    card, pos = jsonDecoder.raw_decode(buffer, pos)
+                except json.JSONDecodeError:
+                    if len(buffer) - pos > oracle.maxCardChars:
+                        raise
+                    break
+                row = {x: card[x] for x in oracle.bulkKeepFields if x in card}
+                if "card_faces" in row:
+                    row["card_faces"] = [
+                        {x: face[x] for x in oracle.faceKeepFields if x in face}
+                        for face in row["card_faces"]
+                    ]
+                yield row
+            buffer = buffer[pos:]
+        # A cut-off download or a malformed card leaves text that never decoded.
+        # Raise rather than let a partial table be cached as this bulk file.
+        if not closed or buffer.strip() != "":
+            raise ValueError(
+                f"Bulk file {source} is truncated or malformed near {buffer[:80]!r}."
+            )
+
+    def streamBulk(source: str, chunkSize: int = 5000):
+        """Builds the card table from a bulk file in chunks of `chunkSize` cards, keeping peak memory bounded."""
+        chunks = []
+        rows = []
+        for row in oracle.iterBulkCards(source):
+            rows.append(row)
+            if len(rows) == chunkSize:
+                chunks.append(pd.DataFrame.from_records(rows))
+                rows = []
+        if rows != [] or chunks == []:
+            chunks.append(pd.DataFrame.from_records(rows))
+        oracleDf = pd.concat(chunks, ignore_index=True)
+        return oracleDf.reindex(
+            columns=[x for x in oracle.bulkKeepFields if x in oracleDf.columns]
+        )
+
+    def clean(source=None, stream: bool = False):
+        oracleDf = oracle.bulk(source, stream)
         oracleDf = oracleDf[~oracleDf["layout"].str.contains("art_series")]
         oracleDf = oracleDf[~oracleDf["layout"].str.contains("token")]
         oracleDf = oracleDf[
@@ -50,8 +253,7 @@ class oracle:
                 oracleDf["name"] == "Pick Your Poison"
             )
         ]
-        oracleDf["name"] = oracleDf["name"].str.split(" // ").str[0]
-        oracleDf["name"] = oracleDf["name"].str.split("/").str[0]
+        oracleDf["name"] = cardNames.normalizeNames(oracleDf["name"])
         return oracleDf
 
     def expand_faces(row):
@@ -64,17 +266,142 @@ class oracle:
             row["back_name"] = back.get("name")
             x = back.get("type_line")
             row["back_type_line"] = x
-            if "Creature" in x:
+            if x is not None and "Creature" in x:
                 row["back_power"] = back.get("power")
                 row["back_toughness"] = back.get("toughness")
             row["back_type_line"] = back.get("type_line")
             row["back_oracle_text"] = back.get("oracle_text")
         return row
 
-    def expandedClean():
-        oracleDf = oracle.clean()
+    @instrumentation.timed("oracle.expandFaces")
+    def expandFaces(oracleDf):
+        """Column-oriented equivalent of `oracleDf.apply(oracle.expand_faces, axis=1)`.
+
+        Args:
+            oracleDf (DataFrame): Oracle cards, with a `card_faces` column for multi-faced cards
+
+        Returns:
+            DataFrame: oracleDf with the front face fields filled in and the `back_*` columns added
+        """
+        oracleDf = oracleDf.copy()
+        for col in [
+            "back_name",
+            "back_type_line",
+            "back_oracle_text",
+            "back_power",
+            "back_toughness",
+        ]:
+            if col not in oracleDf.columns:
+                oracleDf[col] = None
+        if "card_faces" not in oracleDf.columns:
+            return oracleDf
+        multiFaced = (
+            oracleDf["card_faces"].map(lambda x: isinstance(x, list)).to_numpy(bool)
+        )
+        if not multiFaced.any():
+            return oracleDf
+        faces = oracleDf["card_faces"].to_numpy()[multiFaced]
+        fronts = [x[0] for x in faces]
+        backs = [x[1] if len(x) > 1 else {} for x in faces]
+        backTypes = [x.get("type_line") for x in backs]
+        backCreature = [x is not None and "Creature" in x for x in backTypes]
+        columns = {
+            "mana_cost": [x.get("mana_cost") for x in fronts],
+            "type_line": [x.get("type_line") for x in fronts],
+            "oracle_text": [x.get("oracle_text") for x in fronts],
+            "back_name": [x.get("name") for x in backs],
+            "back_type_line": backTypes,
+            "back_oracle_text": [x.get("oracle_text") for x in backs],
+            "back_power": [
+                x.get("power") if c else None for x, c in zip(backs, backCreature)
+            ],
+            "back_toughness": [
+                x.get("toughness") if c else None for x, c in zip(backs, backCreature)
+            ],
+        }
+        for col, values in columns.items():
+            oracleDf[col] = oracleDf[col].astype(object)
+            oracleDf.loc[multiFaced, col] = values
+        return oracleDf
+
+    @instrumentation.timed("oracle.buildExpandedClean")
+    def buildExpandedClean(source=None, stream: bool = True):
+        oracleDf = oracle.clean(source, stream)
         oracleDf["colors"] = oracleDf["colors"].fillna(oracleDf["color_identity"])
-        oracleDf = oracleDf.apply(oracle.expand_faces, axis=1)
+        oracleDf = oracle.expandFaces(oracleDf)
+        return oracleDf
+
+    def cachePath(updatedAt: str):
+        """Path of the on-disk oracle table for a given bulk file `updated_at` stamp."""
+        stamp = re.sub(r"[^0-9A-Za-z]", "", updatedAt)
+        return os.path.join(oracleCacheDir, f"oracle-{stamp}.parquet")
+
+    def latestCachePath():
+        if not os.path.isdir(oracleCacheDir):
+            return None
+        cached = sorted(
+            x
+            for x in os.listdir(oracleCacheDir)
+            if x.startswith("oracle-") and x.endswith(".parquet")
+        )
+        if cached == []:
+            return None
+        return os.path.join(oracleCacheDir, cached[-1])
+
+    def loadCache(path: str):
+        oracleDf = pd.read_parquet(path)
+        for col in ["colors", "color_identity"]:
+            oracleDf[col] = oracleDf[col].map(lambda x: list(x) if x is not None else x)
+        return oracleDf
+
+    def writeCache(oracleDf, path: str):
+        os.makedirs(oracleCacheDir, exist_ok=True)
+        oracleDf = oracleDf.reindex(columns=scryKeepCols).reset_index(drop=True)
+        oracleDf.to_parquet(f"{path}.tmp", index=False)
+        os.replace(f"{path}.tmp", path)
+        for x in os.listdir(oracleCacheDir):
+            stale = os.path.join(oracleCacheDir, x)
+            if x.startswith("oracle-") and stale != path:
+                os.remove(stale)
+        return oracleDf
+
+    def expandedClean(refresh: bool = False):
+        """Returns the expanded oracle table, shared by every caller in the session.
+
+        The table is kept in memory after the first call and on disk under
+        `oracleCacheDir`, keyed by the bulk file's `updated_at`, so it is only
+        rebuilt when Scryfall publishes a new bulk file.
+
+        Args:
+            refresh (bool, optional): Re-check the bulk-data manifest even if a table is already loaded. Defaults to False.
+
+        Returns:
+            DataFrame: Oracle cards with the `scryKeepCols` columns
+        """
+        if not refresh and "df" in oracle._memo:
+            instrumentation.count("oracleCache.memory")
+            return oracle._memo["df"]
+        try:
+            updatedAt = oracle.manifest()["updated_at"]
+            path = oracle.cachePath(updatedAt)
+        except requests.RequestException:
+            path = oracle.latestCachePath()
+            if path is None:
+                raise
+            logging.warning(f"Scryfall unreachable, using cached oracle {path}.")
+            updatedAt = path
+        if oracle._memo.get("updated_at") == updatedAt:
+            instrumentation.count("oracleCache.memory")
+            return oracle._memo["df"]
+        if os.path.exists(path):
+            logging.info(f"Loading oracle from {path}.")
+            instrumentation.count("oracleCache.disk")
+            oracleDf = oracle.loadCache(path)
+        else:
+            logging.info(f"Oracle cache {path} not found. Rebuilding from Scryfall.")
+            instrumentation.count("oracleCache.rebuilt")
+            oracleDf = oracle.writeCache(oracle.buildExpandedClean(), path)
+        oracle._memo = {"updated_at": updatedAt, "df": oracleDf}
         return oracleDf
 
 
@@ -87,21 +414,11 @@ class mtgoScrape:
     def __init__(self):
         return
 
-    def formatDeckList(format: str, year, month):
-        """_summary_
-
-        Args:
-            format (str): MTG Format
-            year (_type_): Year to search for decks
-            month (_type_): Month to search for decks
+    def parseDeckListPage(html: str, format: str):
+        """Parses a month index page into the tournament dicts returned by formatDeckList."""
+        import bs4
 
-        Returns:
-            _type_: List of dicts for each tournament, with a 'name', 'date', 'url list
-        """
-        logging.info(f"Searching for {format} deck lists, {year}-{month:02d}.")
-        deckListUrl = f"https://www.mtgo.com/decklists/{year}/{month:02d}?filter={format.capitalize()}"
-        reqGet = requests.get(deckListUrl)
-        decklistPage = bs4.BeautifulSoup(reqGet.text, "html.parser")
+        decklistPage = bs4.BeautifulSoup(html, htmlParser)
         decklistSelects = decklistPage.select("a.decklists-link")
         tournamentLists = [x for x in decklistSelects if format in x["href"]]
         tournInfoList = []
@@ -111,15 +428,90 @@ class mtgoScrape:
             tournName = f"{date_obj.date()} {tag.select_one('h3').text.strip()}"
             tournUrl = tag["href"]
             tournInfoList.append(
-                {"name": tournName, "date": date_obj.date(), "url": tournUrl}
+                {
+                    "name": tournName,
+                    "date": date_obj.date(),
+                    "url": tournUrl,
+                    "format": format,
+                }
             )
         return tournInfoList
 
-    def getDecksFromUrlScrape(url: str):
+    def deckListPageUrl(format: str, year, month):
+        return f"https://www.mtgo.com/decklists/{year}/{month:02d}?filter={format.capitalize()}"
+
+    @instrumentation.timed("mtgoScrape.formatDeckList")
+    def formatDeckList(format: str, year, month):
+        """_summary_
+
+        Args:
+            format (str): MTG Format
+            year (_type_): Year to search for decks
+            month (_type_): Month to search for decks
+
+        Returns:
+            _type_: List of dicts for each tournament, with a 'name', 'date', 'url', 'format'
+        """
+        logging.info(f"Searching for {format} deck lists, {year}-{month:02d}.")
+        deckListUrl = mtgoScrape.deckListPageUrl(format, year, month)
+        monthEnd = pd.Timestamp(year=year, month=month, day=1) + pd.offsets.MonthEnd()
+        if monthEnd.date() < dt.date.today() - dt.timedelta(days=lateListingDays):
+            ttl = closedMonthTtl
+        else:
+            ttl = openMonthTtl
+        reqGet = network.get(deckListUrl, ttl=ttl)
+        reqGet.raise_for_status()
+        return mtgoScrape.parseDeckListPage(reqGet.text, format)
+
+    def formatDeckListRange(formats, startDate, endDate, workers: int = 8):
+        """Lists the tournaments of several formats between two dates in one call,
+        fetching every month index page concurrently.
+
+        Args:
+            formats (str | list): MTG Format, or list of formats
+            startDate (date): First tournament date to keep (inclusive)
+            endDate (date): Last tournament date to keep (inclusive)
+            workers (int, optional): Concurrent index page requests. Defaults to 8.
+
+        Returns:
+            list: Deduplicated tournament dicts, as from formatDeckList, sorted by date
+        """
+        if isinstance(formats, str):
+            formats = [formats]
+        if isinstance(startDate, dt.datetime):
+            startDate = startDate.date()
+        if isinstance(endDate, dt.datetime):
+            endDate = endDate.date()
+        months = pd.date_range(
+            start=dt.date(startDate.year, startDate.month, 1),
+            end=dt.date(endDate.year, endDate.month, 1),
+            freq="MS",
+        )
+        pages = [(f, m.year, m.month) for f in formats for m in months]
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            monthLists = list(
+                executor.map(lambda x: mtgoScrape.formatDeckList(*x), pages)
+            )
+        tournaments = {}
+        for monthList in monthLists:
+            for tourn in monthList:
+                if startDate <= tourn["date"] <= endDate:
+                    tournaments.setdefault(tourn["url"], tourn)
+        return sorted(tournaments.values(), key=lambda x: (x["date"], x["url"]))
+
+    def newDriver():
+        """Starts a headless Chrome driver for scraping tournament pages."""
+        from browser import browser
+
+        return browser.newDriver()
+
+    @instrumentation.timed("mtgoScrape.getDecksFromUrlScrape")
+    def getDecksFromUrlScrape(url: str, driver=None):
         """_summary_
 
         Args:
             url (str): MTGO Tournament Results URL
+            driver (WebDriver, optional): Driver to reuse, e.g. from a BrowserPool. Defaults to a new driver that is quit afterwards.
 
         Returns:
             _type_: Dictionary where the key is a deck, the value is a dictionary of size 2, with main board and side board.
@@ -127,48 +519,135 @@ class mtgoScrape:
         logging.info(
             f"{url} not found. Getting decks from web-page https://www.mtgo.com{url}"
         )
-        options = Options()
-        options.add_argument("--headless")
-        options.add_argument("--disable-gpu")
-        options.add_argument("--disable-extensions")
-        options.add_argument("--blink-settings=imagesEnabled=false")
-        driver = webdriver.Chrome()
-        driver.get(f"https://www.mtgo.com{url}")
-        deckLen = len(driver.find_elements(By.CSS_SELECTOR, '[id*="Decklist"]'))
-        mainDecks = [
-            driver.find_element(
-                by=By.CSS_SELECTOR,
-                value=f"#decklist{i}Decklist > div:nth-child(2) > div:nth-child(1) > div:nth-child(1)",
-            ).text
-            for i in range(deckLen)
-        ]
-        sideBoards = [
-            driver.find_element(
-                by=By.CSS_SELECTOR,
-                value=f"#decklist{i}Decklist > div:nth-child(2) > div:nth-child(1) > ul:nth-child(4)",
-            ).text
-            for i in range(deckLen)
-        ]
-        driver.quit()
-        deckDict = {}
-        for i in range(deckLen):
-            deckDict[f"Deck {i}"] = {"main": mainDecks[i], "side": sideBoards[i]}
+        network.requireLive(url)
+        from browser import browser
+
+        ownDriver = driver is None
+        if ownDriver:
+            driver = mtgoScrape.newDriver()
+        try:
+            driver.get(f"https://www.mtgo.com{url}")
+            deckDict = browser.readDecks(driver)
+        finally:
+            if ownDriver:
+                driver.quit()
+        mtgoScrape.saveDecks(url, deckDict)
+        return deckDict
+
+    def cachedDecksPath(url: str):
+        return os.path.join(decklistCacheDir, f"{url.split('/')[2]}.json")
+
+    def saveDecks(url: str, deckDict: dict):
         if deckDict != {}:
-            json.dump(
-                deckDict, open(f"MTGO Decklists Scraped/{url.split('/')[2]}.json", "w")
-            )
+            with open(mtgoScrape.cachedDecksPath(url), "w") as f:
+                json.dump(deckDict, f)
+
+    def parseDecksFromPage(html: str):
+        """Reads the decklists from the data a tournament page embeds for its own scripts.
+
+        Args:
+            html (str): Tournament results page HTML
+
+        Raises:
+            ValueError: The page does not contain the decklist payload
+
+        Returns:
+            dict: Same shape as getDecksFromUrlScrape, {"Deck i": {"main": ..., "side": ...}}. Decks of tournaments with standings also get their final "rank".
+        """
+        marker = html.find("window.MTGO.decklists.data")
+        if marker == -1:
+            raise ValueError("Decklist data not found in page.")
+        start = html.index("=", marker) + 1
+        while html[start].isspace():
+            start += 1
+        pageData, _ = json.JSONDecoder().raw_decode(html, start)
+        # Leagues have no standings, and their decks are listed in no particular order
+        ranks = {
+            str(x["loginid"]): int(x["rank"]) for x in pageData.get("standings") or []
+        }
+        deckDict = {}
+        for i, eachDeck in enumerate(pageData["decklists"]):
+            boards = {}
+            for board, key in [("main", "main_deck"), ("side", "sideboard_deck")]:
+                quantities = {}
+                for eachCard in eachDeck.get(key, []):
+                    name = eachCard["card_attributes"]["card_name"]
+                    quantities[name] = quantities.get(name, 0) + int(eachCard["qty"])
+                boards[board] = "\n".join(f"{v} {k}" for k, v in quantities.items())
+            if str(eachDeck.get("loginid")) in ranks:
+                boards["rank"] = ranks[str(eachDeck["loginid"])]
+            deckDict[f"Deck {i}"] = boards
+        return deckDict
+
+    @instrumentation.timed("mtgoScrape.getDecksFromUrlHttp")
+    def getDecksFromUrlHttp(url: str):
+        """Gets the decks of a tournament with a single HTTP request, no browser.
+
+        Args:
+            url (str): MTGO Tournament Results URL
+
+        Returns:
+            dict: Same shape as getDecksFromUrlScrape
+        """
+        logging.info(f"Getting decks from page data https://www.mtgo.com{url}")
+        reqGet = network.get(f"https://www.mtgo.com{url}")
+        reqGet.raise_for_status()
+        deckDict = mtgoScrape.parseDecksFromPage(reqGet.text)
+        mtgoScrape.saveDecks(url, deckDict)
         return deckDict
 
+    def tryDecksFromUrlHttp(url: str):
+        try:
+            return mtgoScrape.getDecksFromUrlHttp(url)
+        except (requests.RequestException, ValueError, KeyError, TypeError) as e:
+            logging.warning(f"No page data for {url} ({e}), falling back to Selenium.")
+            return None
+
     def getDecksFromUrl(url: str):
-        filename = f"MTGO Decklists Scraped/{url.split('/')[2]}.json"
+        filename = mtgoScrape.cachedDecksPath(url)
         if os.path.exists(filename):
+            instrumentation.count("decklistCache.hit")
             with open(filename, "r") as f:
                 return json.load(f)
         else:
             logging.warning(f"File not found: {filename}")
-            outDict = mtgoScrape.getDecksFromUrlScrape(url)
+            instrumentation.count("decklistCache.miss")
+            outDict = mtgoScrape.tryDecksFromUrlHttp(url)
+            if outDict is None:
+                outDict = mtgoScrape.getDecksFromUrlScrape(url)
             return outDict
 
+    def getDecksFromUrls(listOfUrls: list, workers: int = 1):
+        """Returns {url: decks dict} for each url. Uncached tournaments are read from
+        their page data with `workers` concurrent requests, and those that fail are
+        scraped on a BrowserPool of `workers` drivers.
+        """
+        missing = [
+            x
+            for x in dict.fromkeys(listOfUrls)
+            if not os.path.exists(mtgoScrape.cachedDecksPath(x))
+        ]
+        fetched = {}
+        if workers > 1 and len(missing) > 1:
+            with ThreadPoolExecutor(max_workers=workers) as executor:
+                httpDecks = executor.map(mtgoScrape.tryDecksFromUrlHttp, missing)
+                fetched = {k: v for k, v in zip(missing, httpDecks) if v is not None}
+            instrumentation.count("decklistCache.miss", len(missing))
+            # Failed pages go straight to Selenium, without a second HTTP request
+            failed = [x for x in missing if x not in fetched]
+            if len(failed) > 1 and network.mode != "replay":
+                from browser import BrowserPool
+
+                with BrowserPool(min(workers, len(failed))) as pool:
+                    fetched.update(pool.map(failed))
+            else:
+                for url in failed:
+                    fetched[url] = mtgoScrape.getDecksFromUrlScrape(url)
+        return {
+            x: fetched[x] if x in fetched else mtgoScrape.getDecksFromUrl(x)
+            for x in listOfUrls
+        }
+
     def deckStringCleaner(deckString):
         """_summary_
 
@@ -179,19 +658,54 @@ class mtgoScrape:
             _type_: _description_
         """
         outDict = {}
-        deckString = deckString.split("\n")
-        for eachLine in deckString:
-            if "(" in eachLine:
-                deckString.remove(eachLine)
-            elif "Cards" in eachLine:
-                deckString.remove(eachLine)
-            else:
-                pass
-        for eachLine in deckString:
-            eachLineSplitUp = eachLine.split(" ")
-            outDict[" ".join(eachLineSplitUp[1:])] = int(eachLineSplitUp[0])
+        for eachLine in deckString.split("\n"):
+            if eachLine == "" or "(" in eachLine or "Cards" in eachLine:
+                continue
+            quantity, _, cardName = eachLine.partition(" ")
+            outDict[cardName] = int(quantity)
         return outDict
 
+    def flattenDecks(decksDict, url=None, columns=None):
+        """Appends every card of every deck in a tournament to flat column lists,
+        so many tournaments can be turned into a single DataFrame at the end.
+
+        Args:
+            decksDict (dict): Output of getDecksFromUrl, {"Deck 0": {'main': ..., 'side':...}, ...}
+            url (str, optional): Tournament url written to the "Deck URL" column
+            columns (dict, optional): Column lists to append to. Defaults to new lists.
+
+        Returns:
+            dict: {"Deck URL", "Deck", "Main/Side", "Card Name", "Quantity"} column lists
+        """
+        if columns is None:
+            columns = {
+                x: []
+                for x in ["Deck URL", "Deck", "Main/Side", "Card Name", "Quantity"]
+            }
+        urls, decks, mainSides, cardNames, quantities = columns.values()
+        for eachDeck, boards in decksDict.items():
+            for mainSide, key in [("Main", "main"), ("Side", "side")]:
+                cards = mtgoScrape.deckStringCleaner(boards[key])
+                urls += [url] * len(cards)
+                decks += [eachDeck] * len(cards)
+                mainSides += [mainSide] * len(cards)
+                cardNames += cards.keys()
+                quantities += cards.values()
+        return columns
+
+    def deckRanks(decksByUrl: dict):
+        """Final standings of the decks whose tournament page had them.
+
+        Returns:
+            dict: {(Deck URL, Deck): rank}
+        """
+        return {
+            (url, deck): boards["rank"]
+            for url, decksDict in decksByUrl.items()
+            for deck, boards in decksDict.items()
+            if "rank" in boards
+        }
+
     def deckCleaner(deckDict):
         """This takes the output from
 
@@ -238,27 +752,33 @@ class mtgoScrape:
         outDf = outDf.set_index(["Deck", "Main/Side", "Card Name"])
         return outDf
 
-    def getDeckListsFromUrlList(listOfUrls: list):
+    @instrumentation.timed("mtgoScrape.getDeckListsFromUrlList")
+    def getDeckListsFromUrlList(listOfUrls: list, workers: int = 1):
         """_summary_
 
         Args:
             listOfUrls (list): _description_
+            workers (int, optional): Number of browsers used to scrape uncached tournaments. Defaults to 1.
 
         Returns:
             DataFrame: DataFrame of all decks in urllist
         """
-        resultsLists = []
-        for eachUrl in listOfUrls:
-            tempDict = mtgoScrape.getDecksFromUrl(eachUrl)
-            tempDf = mtgoScrape.getDeckListsFromResults(tempDict)
-            tempDf["Deck URL"] = eachUrl
-            resultsLists += [tempDf]
-        outDf = pd.concat(resultsLists).reset_index(drop=False)
-        outDf = outDf.set_index(["Deck URL", "Deck", "Main/Side", "Card Name"])
-        outDf = outDf.drop(columns=["index"])
-        outDf = outDf.reset_index()
-        outDf["Card Name"] = outDf["Card Name"].str.split(" // ").str[0]
-        outDf["Card Name"] = outDf["Card Name"].str.split("/").str[0]
+        decksByUrl = mtgoScrape.getDecksFromUrls(listOfUrls, workers)
+        return mtgoScrape.buildDeckLists(decksByUrl)
+
+    @instrumentation.timed("mtgoScrape.buildDeckLists")
+    def buildDeckLists(decksByUrl: dict):
+        """Builds the deck DataFrame for {url: decks dict} from flat rows in one go.
+
+        Returns:
+            DataFrame: Indexed by Deck URL, Deck, Main/Side, Card Name with Quantity and Card ID columns
+        """
+        columns = mtgoScrape.flattenDecks({})
+        for eachUrl, decksDict in decksByUrl.items():
+            columns = mtgoScrape.flattenDecks(decksDict, eachUrl, columns)
+        outDf = pd.DataFrame(columns)
+        outDf["Card ID"] = cardNames.cardIds(outDf["Card Name"])
+        outDf["Card Name"] = cardNames.names(outDf["Card ID"])
         outDf = outDf.set_index(["Deck URL", "Deck", "Main/Side", "Card Name"])
         outDf = outDf.sort_index()
         return outDf
@@ -269,22 +789,261 @@ class mtgoScrape:
         deckDf = deckDf.sort_index()
         return deckDf
 
-    def setDecksToClasses(deckDf, qf):
+    def deckArrays(deckDf):
+        """Splits a deck table into the flat arrays used by classifyDecks and Deck.
+
+        Returns:
+            tuple: (Index of (Deck URL, Deck), deck code per row, card IDs, quantities, sideboard flags)
+        """
         deckDf = mtgoScrape.removeCardIndex(deckDf)
-        deckDf = identifyDeck.enrichDataFrame(
-            deckDf.reset_index(), oracle.expandedClean()
+        if "Card ID" in deckDf.columns:
+            cardIds = deckDf["Card ID"].to_numpy(np.int32)
+        else:
+            cardIds = cardNames.cardIds(deckDf["Card Name"]).astype(np.int32)
+        quantities = deckDf["Quantity"].to_numpy(np.int16)
+        isSide = (deckDf["Main/Side"] == "Side").to_numpy()
+        # The rows are sorted by deck, so a new deck starts wherever either level
+        # changes. This avoids factorizing the index as tuples.
+        urlCodes, deckNameCodes = deckDf.index.codes
+        newDeck = np.ones(len(deckDf), dtype=bool)
+        newDeck[1:] = (urlCodes[1:] != urlCodes[:-1]) | (
+            deckNameCodes[1:] != deckNameCodes[:-1]
         )
-        deckDf = deckDf.set_index(["Deck URL", "Deck"])
-        decklists = list(deckDf.index.unique())
+        deckCodes = np.cumsum(newDeck) - 1
+        deckIndex = deckDf.index[newDeck].remove_unused_levels()
+        return deckIndex, deckCodes, cardIds, quantities, isSide
+
+    def classifyDecks(deckDf, qf, table=None):
+        """Classifies every deck in a deck table at once with grouped array operations.
+
+        Gives the same colour, key cards, land count, average CMC and archetype as
+        building a Deck for each deck.
+
+        Args:
+            deckDf (DataFrame): Deck table from getDeckListsFromUrlList or deckStore.read
+            qf (str): Query format, selecting the key card list
+            table (OracleTable, optional): Defaults to the session's shared table
+
+        Returns:
+            DataFrame: One row per (Deck URL, Deck) with Colour, Key Cards, Land Count, Avg CMC, Archetype and Deck Name
+        """
+        deckIndex, deckCodes, cardIds, quantities, isSide = mtgoScrape.deckArrays(
+            deckDf
+        )
+        return mtgoScrape.classifyArrays(
+            deckIndex, deckCodes, cardIds, quantities, isSide, qf, table
+        )
+
+    @instrumentation.timed("mtgoScrape.classifyArrays")
+    def classifyArrays(deckIndex, deckCodes, cardIds, quantities, isSide, qf, table):
+        if table is None:
+            table = OracleTable.shared()
+        table.grow()
+        deckCount = len(deckIndex)
+        isLand = table.isLand[cardIds]
+        colourMasks = table.colourMask[cardIds]
+        colourMask = np.zeros(deckCount, dtype=np.int64)
+        for bit in range(len(identifyDeck.custom_order)):
+            hasColour = np.bincount(
+                deckCodes, weights=(colourMasks >> bit) & 1, minlength=deckCount
+            )
+            colourMask |= (hasColour > 0).astype(np.int64) << bit
+        colourNames = [OracleTable.colourName(x) for x in range(32)]
+        landCount = np.bincount(
+            deckCodes, weights=quantities * isLand, minlength=deckCount
+        ).astype(np.int64)
+        cmc = table.cmc[cardIds]
+        hasCmc = ~isLand & ~np.isnan(cmc)
+        cmcSum = np.bincount(
+            deckCodes[hasCmc], weights=cmc[hasCmc], minlength=deckCount
+        )
+        cmcCount = np.bincount(deckCodes[hasCmc], minlength=deckCount)
+        avgCmc = np.divide(
+            cmcSum,
+            cmcCount,
+            out=np.full(deckCount, np.nan),
+            where=cmcCount > 0,
+        )
+        rules = ArchetypeRules.load(qf)
+        deckKeyCards, archetypes = rules.classify(
+            deckCodes, cardIds, quantities, isSide, colourMask, landCount
+        )
+        summaryDf = pd.DataFrame(
+            {
+                "Colour": [colourNames[x] for x in colourMask],
+                "Key Cards": deckKeyCards,
+                "Land Count": landCount,
+                "Avg CMC": avgCmc,
+                "Archetype": archetypes,
+            },
+            index=deckIndex,
+        )
+        summaryDf["Deck Name"] = summaryDf["Colour"] + " " + summaryDf["Archetype"]
+        return summaryDf
+
+    @instrumentation.timed("mtgoScrape.setDecksToClasses")
+    def setDecksToClasses(deckDf, qf):
+        table = OracleTable.shared()
+        deckIndex, deckCodes, cardIds, quantities, isSide = mtgoScrape.deckArrays(
+            deckDf
+        )
+        summaryDf = mtgoScrape.classifyArrays(
+            deckIndex, deckCodes, cardIds, quantities, isSide, qf, table
+        )
+        return mtgoScrape.decksFromSummary(
+            deckIndex, deckCodes, cardIds, quantities, isSide, summaryDf, table
+        )
+
+    def decksFromSummary(
+        deckIndex, deckCodes, cardIds, quantities, isSide, summaryDf, table
+    ):
+        """Builds a Deck per row of a classifyArrays summary without re-classifying.
+
+        The rows are put in deck order once, so each Deck holds slices (views) of
+        the shared arrays rather than copies.
+        """
+        order = np.argsort(deckCodes, kind="stable")
+        starts = np.searchsorted(deckCodes[order], np.arange(len(deckIndex) + 1))
+        cardIds, quantities, isSide = cardIds[order], quantities[order], isSide[order]
+        columns = [summaryDf[x].tolist() for x in summaryDf.columns]
         deckObjectList = []
-        for eachDeck in decklists:
-            tempDeckObj = Deck(deckDf.loc[eachDeck], qf)
+        deckIds = zip(*(deckIndex.get_level_values(x).tolist() for x in [0, 1]))
+        for i, (deckId, *summary) in enumerate(zip(deckIds, *columns)):
+            rows = slice(starts[i], starts[i + 1])
+            tempDeckObj = Deck.fromSummary(
+                deckId,
+                cardIds[rows],
+                quantities[rows],
+                isSide[rows],
+                summary,
+                table,
+            )
             deckObjectList.append(tempDeckObj)
+        instrumentation.count("decks.classified", len(deckObjectList))
         return deckObjectList
 
-    def mtgoScrapeMain(listOfUrls: list, qf):
-        deckDf = mtgoScrape.getDeckListsFromUrlList(listOfUrls)
-        return mtgoScrape.setDecksToClasses(deckDf, qf)
+    def mtgoScrapeMain(listOfUrls: list, qf, workers: int = 1, processes: int = 1):
+        """Parses and classifies the decks of every tournament in listOfUrls.
+
+        Args:
+            listOfUrls (list): MTGO tournament URLs
+            qf (str): Query format, selecting the key card list
+            workers (int, optional): Concurrent fetches for uncached tournaments. Defaults to 1.
+            processes (int, optional): Parse and classify on a process pool of this size. Defaults to 1, in this process.
+
+        Returns:
+            list: Deck objects, ordered by (Deck URL, Deck)
+        """
+        with instrumentation.run("mtgoScrapeMain"):
+            if processes > 1:
+                return mtgoScrape.mtgoScrapeParallel(listOfUrls, qf, processes, workers)
+            deckDf = mtgoScrape.getDeckListsFromUrlList(listOfUrls, workers)
+            return mtgoScrape.setDecksToClasses(deckDf, qf)
+
+    _shardTable = None
+
+    def initShardWorker(tableDir: str):
+        """Process pool initializer: takes the parent's card IDs and maps its OracleTable."""
+        mtgoScrape._shardTable = OracleTable.loadArrays(tableDir)
+
+    def classifyShard(listOfUrls: list, qf, prefetched: dict):
+        """Parses and classifies one shard of tournaments in a pool worker.
+
+        Returns:
+            tuple: (deckArrays output, classifyArrays summary, names of the card IDs the worker added, the shard's instrumentation timers and counters)
+        """
+        # Workers serve several shards, so each shard reports only its own work
+        instrumentation.reset()
+        decksByUrl = {
+            x: prefetched[x] if x in prefetched else mtgoScrape.getDecksFromUrl(x)
+            for x in listOfUrls
+        }
+        deckDf = mtgoScrape.buildDeckLists(decksByUrl)
+        arrays = mtgoScrape.deckArrays(deckDf)
+        summaryDf = mtgoScrape.classifyArrays(*arrays, qf, mtgoScrape._shardTable)
+        addedNames = cardNames._names[mtgoScrape._shardTable.baseSize :]
+        return arrays, summaryDf, addedNames, instrumentation.collected()
+
+    @instrumentation.timed("mtgoScrape.mtgoScrapeParallel")
+    def mtgoScrapeParallel(
+        listOfUrls: list, qf, processes=None, workers: int = 1, shardSize=None
+    ):
+        """mtgoScrapeMain on a process pool, for large backfills.
+
+        Uncached tournaments are fetched here first. The URLs are then split into
+        contiguous shards that workers parse and classify. The workers share the
+        OracleTable arrays through memory-mapped files and take the card IDs of
+        this process, so only the card names they add need remapping on merge.
+        Gives the same decks, in the same order, as the single-process path.
+
+        Args:
+            processes (int, optional): Pool size. Defaults to the CPU count.
+            shardSize (int, optional): Tournaments per task. Defaults to about four tasks per process.
+        """
+        if processes is None:
+            processes = os.cpu_count()
+        urls = sorted(dict.fromkeys(listOfUrls))
+        missing = [x for x in urls if not os.path.exists(mtgoScrape.cachedDecksPath(x))]
+        prefetched = mtgoScrape.getDecksFromUrls(missing, workers) if missing else {}
+        if shardSize is None:
+            shardSize = max(1, -(-len(urls) // (processes * 4)))
+        shards = [urls[i : i + shardSize] for i in range(0, len(urls), shardSize)]
+        table = OracleTable.shared()
+        with tempfile.TemporaryDirectory(prefix="mtgo-oracle-") as tableDir:
+            table.saveArrays(tableDir)
+            with ProcessPoolExecutor(
+                max_workers=processes,
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=mtgoScrape.initShardWorker,
+                initargs=(tableDir,),
+            ) as executor:
+                results = list(
+                    executor.map(
+                        mtgoScrape.classifyShard,
+                        shards,
+                        [qf] * len(shards),
+                        [
+                            {x: prefetched[x] for x in y if x in prefetched}
+                            for y in shards
+                        ],
+                    )
+                )
+        baseIds = np.arange(table.baseSize, dtype=np.int32)
+        deckIndexes, deckCodes, cardIds, quantities, isSide, summaries = (
+            [] for _ in range(6)
+        )
+        deckCount = 0
+        for arrays, summaryDf, addedNames, collected in results:
+            instrumentation.merge(*collected)
+            mapping = np.concatenate(
+                [baseIds, cardNames.cardIds(addedNames).astype(np.int32)]
+            )
+            deckIndexes.append(arrays[0])
+            deckCodes.append(arrays[1] + deckCount)
+            cardIds.append(mapping[arrays[2]])
+            quantities.append(arrays[3])
+            isSide.append(arrays[4])
+            summaries.append(summaryDf)
+            deckCount += len(arrays[0])
+        if deckCount == 0:
+            return []
+        table.grow()
+        deckIndex = pd.MultiIndex.from_arrays(
+            [
+                np.concatenate([x.get_level_values(i) for x in deckIndexes])
+                for i in [0, 1]
+            ],
+            names=deckIndexes[0].names,
+        )
+        return mtgoScrape.decksFromSummary(
+            deckIndex,
+            np.concatenate(deckCodes),
+            np.concatenate(cardIds),
+            np.concatenate(quantities),
+            np.concatenate(isSide),
+            pd.concat(summaries),
+            table,
+        )
 
 
 class identifyDeck:
@@ -311,13 +1070,18 @@ class identifyDeck:
         else:
             return True
 
+    @instrumentation.timed("identifyDeck.enrichDataFrame")
     def enrichDataFrame(deckDf, oracleDf):
         deckDf = deckDf.reset_index(drop=True)
+        if "Card ID" not in deckDf.columns:
+            deckDf["Card ID"] = cardNames.cardIds(deckDf["Card Name"])
+        oracleDf = oracleDf[scryKeepCols].assign(
+            **{"Card ID": cardNames.cardIds(oracleDf["name"], register=False)}
+        )
         deckDf = pd.merge(
             deckDf,
-            oracleDf[scryKeepCols],
-            left_on="Card Name",
-            right_on="name",
+            oracleDf[oracleDf["Card ID"] >= 0],
+            on="Card ID",
             how="left",
         )
         deckDf = deckDf.drop(columns=["name"])
@@ -339,21 +1103,7 @@ class dataAnalysis:
         return merged
 
     def expand_faces(row):
-        if isinstance(row.get("card_faces"), list):
-            front = row["card_faces"][0]
-            back = row["card_faces"][1] if len(row["card_faces"]) > 1 else {}
-            row["mana_cost"] = front.get("mana_cost")
-            row["type_line"] = front.get("type_line")
-            row["oracle_text"] = front.get("oracle_text")
-            row["back_name"] = back.get("name")
-            x = back.get("type_line")
-            row["back_type_line"] = x
-            if "Creature" in x:
-                row["back_power"] = back.get("power")
-                row["back_toughness"] = back.get("toughness")
-            row["back_type_line"] = back.get("type_line")
-            row["back_oracle_text"] = back.get("oracle_text")
-        return row
+        return oracle.expand_faces(row)
 
     def getJaccardForPair(deck1id, deck2id, mainDf):
         deck1 = mainDf.loc[deck1id].sort_index()
@@ -368,142 +1118,1098 @@ class dataAnalysis:
     def getDeckLists(df):
         return df.index.unique()
 
-    def jaccardMain(listOfUrls: list):
+    def deckCardMatrix(deckDf, mainSide=None):
+        """Builds a sparse deck x card quantity matrix from a deck table.
+
+        Args:
+            deckDf (DataFrame): Deck table from getDeckListsFromUrlList, removeCardIndex or deckStore.read
+            mainSide (str, optional): "Main" or "Side" to keep one board. Defaults to both, summed.
+
+        Returns:
+            tuple: (csr_matrix of quantities, Index of (Deck URL, Deck), array of card IDs per column)
+        """
+        df = deckDf.reset_index()
+        if mainSide is not None:
+            df = df[df["Main/Side"] == mainSide]
+        if "Card ID" in df.columns:
+            ids = df["Card ID"].to_numpy()
+        else:
+            ids = cardNames.cardIds(df["Card Name"])
+        deckCodes, deckIndex = pd.factorize(
+            pd.MultiIndex.from_frame(df[["Deck URL", "Deck"]]), sort=True
+        )
+        cardCodes, cardIds = pd.factorize(ids, sort=True)
+        matrix = sparse.csr_matrix(
+            (df["Quantity"].to_numpy(np.int32), (deckCodes, cardCodes)),
+            shape=(len(deckIndex), len(cardIds)),
+        )
+        matrix.sum_duplicates()
+        return matrix, deckIndex, cardIds
+
+    @instrumentation.timed("dataAnalysis.weightedJaccard")
+    def weightedJaccard(matrix, topK=None, chunkSize: int = 1024):
+        """Weighted Jaccard (sum of min / sum of max quantities) between every pair of
+        rows of a deck x card matrix, computed in chunks of `chunkSize` decks.
+
+        min(a, b) is counted as the number of copy thresholds t both quantities reach,
+        so the intersections are a sum of sparse products of the (quantity >= t)
+        matrices, and unions follow from the deck sizes.
+
+        Args:
+            matrix (csr_matrix): Output of deckCardMatrix
+            topK (int, optional): Only keep the k most similar other decks per deck. Defaults to all pairs.
+            chunkSize (int, optional): Decks compared per chunk. Defaults to 1024.
+
+        Returns:
+            ndarray | tuple: Dense similarity matrix, or (neighbour indices, similarities) arrays of shape (decks, k) if topK is set
+        """
+        matrix = sparse.csr_matrix(matrix)
+        deckCount = matrix.shape[0]
+        if topK is not None and deckCount < 2:
+            # No deck has another deck to be compared with
+            return (
+                np.zeros((deckCount, 0), dtype=np.int64),
+                np.zeros((deckCount, 0), dtype=np.float32),
+            )
+        levels = int(matrix.max()) if matrix.nnz > 0 else 0
+        thresholds = [(matrix >= t).astype(np.float32) for t in range(1, levels + 1)]
+        thresholdsT = [x.T.tocsc() for x in thresholds]
+        sizes = np.asarray(matrix.sum(axis=1), dtype=np.float32).ravel()
+        if topK is None:
+            out = np.zeros((deckCount, deckCount), dtype=np.float32)
+        else:
+            topK = min(topK, deckCount - 1)
+            neighbours = np.zeros((deckCount, topK), dtype=np.int64)
+            values = np.zeros((deckCount, topK), dtype=np.float32)
+        for start in range(0, deckCount, chunkSize):
+            stop = min(start + chunkSize, deckCount)
+            intersect = np.zeros((stop - start, deckCount), dtype=np.float32)
+            for rows, rowsT in zip(thresholds, thresholdsT):
+                intersect += (rows[start:stop] @ rowsT).toarray()
+            union = sizes[start:stop, None] + sizes[None, :] - intersect
+            similarity = np.divide(
+                intersect, union, out=np.zeros_like(intersect), where=union > 0
+            )
+            if topK is None:
+                out[start:stop] = similarity
+                continue
+            similarity[np.arange(stop - start), np.arange(start, stop)] = -1
+            best = np.argpartition(-similarity, topK - 1, axis=1)[:, :topK]
+            bestValues = np.take_along_axis(similarity, best, axis=1)
+            order = np.argsort(-bestValues, axis=1)
+            neighbours[start:stop] = np.take_along_axis(best, order, axis=1)
+            values[start:stop] = np.take_along_axis(bestValues, order, axis=1)
+        if topK is None:
+            return out
+        return neighbours, values
+
+    def jaccardMatrix(deckDf, mainSide: str = "Main", chunkSize: int = 1024):
+        """Weighted Jaccard similarity of every pair of decks in a deck table.
+
+        Returns:
+            DataFrame: Square similarity matrix labelled by (Deck URL, Deck)
+        """
+        matrix, deckIndex, _ = dataAnalysis.deckCardMatrix(deckDf, mainSide)
+        similarity = dataAnalysis.weightedJaccard(matrix, chunkSize=chunkSize)
+        return pd.DataFrame(similarity, index=deckIndex, columns=deckIndex)
+
+    def jaccardNeighbours(deckDf, k: int = 5, mainSide: str = "Main"):
+        """The k most similar decks to each deck.
+
+        Returns:
+            DataFrame: One row per (deck, neighbour) with the neighbour's Jaccard similarity and rank
+        """
+        matrix, deckIndex, _ = dataAnalysis.deckCardMatrix(deckDf, mainSide)
+        neighbours, values = dataAnalysis.weightedJaccard(matrix, topK=k)
+        rankCount = neighbours.shape[1]
+        outDf = pd.DataFrame(
+            {
+                "Deck URL": deckIndex.get_level_values(0).repeat(rankCount),
+                "Deck": deckIndex.get_level_values(1).repeat(rankCount),
+                "Rank": np.tile(np.arange(1, rankCount + 1), len(deckIndex)),
+                "Neighbour URL": deckIndex.get_level_values(0)[neighbours.ravel()],
+                "Neighbour": deckIndex.get_level_values(1)[neighbours.ravel()],
+                "Jaccard": values.ravel(),
+            }
+        )
+        return outDf.set_index(["Deck URL", "Deck", "Rank"])
+
+    def deckCardMatrixFromDecks(decks: list, mainSide: str = "Main"):
+        """Sparse deck x card ID quantity matrix built straight from Deck objects."""
+        if mainSide == "Main":
+            rows = [~deck.isSide for deck in decks]
+        elif mainSide == "Side":
+            rows = [deck.isSide for deck in decks]
+        else:
+            rows = [np.ones(len(deck.isSide), dtype=bool) for deck in decks]
+        deckCodes = np.repeat(np.arange(len(decks)), [x.sum() for x in rows])
+        cardIds = np.concatenate(
+            [deck.cardIds[x] for deck, x in zip(decks, rows)] + [np.zeros(0, int)]
+        )
+        quantities = np.concatenate(
+            [deck.quantities[x] for deck, x in zip(decks, rows)] + [np.zeros(0, int)]
+        )
+        matrix = sparse.csr_matrix(
+            (quantities.astype(np.int32), (deckCodes, cardIds)),
+            shape=(len(decks), len(cardNames._names)),
+        )
+        matrix.sum_duplicates()
+        return matrix
+
+    def minHash(matrix, numHashes: int = 128, seed: int = 0):
+        """MinHash signatures of each row of a deck x card matrix.
+
+        Every copy of a card is its own token (card, copy number), so the share of
+        equal signature values between two decks estimates their weighted Jaccard.
+
+        Returns:
+            ndarray: (decks, numHashes) int64 signatures, all -1 for empty decks
+        """
+        matrix = sparse.csr_matrix(matrix)
+        prime = (1 << 31) - 1
+        copies = matrix.data.astype(np.int64)
+        maxCopies = int(copies.max()) if len(copies) > 0 else 1
+        runStarts = np.repeat(np.cumsum(copies) - copies, copies)
+        tokens = np.repeat(matrix.indices.astype(np.int64), copies) * maxCopies + (
+            np.arange(copies.sum()) - runStarts
+        )
+        # Tokens per row from the running total at each row boundary, which also
+        # holds for empty rows at the end, where reduceat would index past the data
+        copyTotals = np.concatenate([[0], np.cumsum(copies)])
+        tokenCounts = copyTotals[matrix.indptr[1:]] - copyTotals[matrix.indptr[:-1]]
+        nonEmpty = tokenCounts > 0
+        starts = (np.cumsum(tokenCounts) - tokenCounts)[nonEmpty]
+        rng = np.random.default_rng(seed)
+        a = rng.integers(1, prime, size=numHashes, dtype=np.int64)
+        b = rng.integers(0, prime, size=numHashes, dtype=np.int64)
+        tokens = tokens % prime
+        signatures = np.full((matrix.shape[0], numHashes), -1, dtype=np.int64)
+        for i in range(numHashes):
+            hashed = (a[i] * tokens + b[i]) % prime
+            if len(starts) > 0:
+                signatures[nonEmpty, i] = np.minimum.reduceat(hashed, starts)
+        return signatures
+
+    def lshClusters(signatures, bands: int = 32, threshold: float = 0.5):
+        """Groups decks whose MinHash signatures collide in any LSH band and agree on
+        at least `threshold` of their values, without comparing all pairs.
+
+        Returns:
+            ndarray: Cluster label per deck (the index of one member), -1 for empty decks
+        """
+        deckCount, numHashes = signatures.shape
+        rowsPerBand = numHashes // bands
+        parent = np.arange(deckCount)
+
+        def find(x):
+            while parent[x] != x:
+                parent[x] = parent[parent[x]]
+                x = parent[x]
+            return x
+
+        nonEmpty = signatures[:, 0] >= 0
+        for band in range(bands):
+            block = signatures[:, band * rowsPerBand : (band + 1) * rowsPerBand]
+            keys = np.zeros(deckCount, dtype=np.uint64)
+            for col in block.T:
+                keys = keys * np.uint64(1000003) + col.astype(np.uint64)
+            _, first, inverse = np.unique(keys, return_index=True, return_inverse=True)
+            heads = first[inverse]
+            candidates = np.flatnonzero((heads != np.arange(deckCount)) & nonEmpty)
+            if len(candidates) == 0:
+                continue
+            agreement = (signatures[candidates] == signatures[heads[candidates]]).mean(
+                axis=1
+            )
+            for x, y in zip(
+                candidates[agreement >= threshold],
+                heads[candidates[agreement >= threshold]],
+            ):
+                rootX, rootY = find(x), find(y)
+                if rootX != rootY:
+                    parent[max(rootX, rootY)] = min(rootX, rootY)
+        labels = np.array([find(x) for x in range(deckCount)])
+        labels[~nonEmpty] = -1
+        return labels
+
+    @instrumentation.timed("dataAnalysis.clusterDecks")
+    def clusterDecks(
+        decks: list,
+        threshold: float = 0.5,
+        mainSide: str = "Main",
+        numHashes: int = 128,
+        bands: int = 32,
+        minSize: int = 3,
+        top: int = 8,
+        seed: int = 0,
+    ):
+        """Clusters decks by card similarity and proposes an archetype for each
+        cluster, e.g. for triaging the decks with no key card:
+
+            dataAnalysis.clusterDecks([x for x in deckList if x.keyCard == []])
+
+        Args:
+            decks (list): Deck objects
+            threshold (float, optional): Estimated weighted Jaccard needed to join decks. Defaults to 0.5.
+            mainSide (str, optional): "Main", "Side" or "Deck" for both. Defaults to "Main".
+            numHashes (int, optional): MinHash signature length. Defaults to 128.
+            bands (int, optional): LSH bands, numHashes must be a multiple of it. Defaults to 32.
+            minSize (int, optional): Smallest cluster to propose. Defaults to 3.
+            top (int, optional): Characteristic nonland cards listed per cluster. Defaults to 8.
+
+        Returns:
+            tuple: (Series of cluster labels indexed by deckId, DataFrame of proposed archetypes by cluster)
+        """
+        matrix = dataAnalysis.deckCardMatrixFromDecks(decks, mainSide)
+        signatures = dataAnalysis.minHash(matrix, numHashes, seed)
+        labels = dataAnalysis.lshClusters(signatures, bands, threshold)
+        deckIndex = pd.Index([x.deckId for x in decks], tupleize_cols=False)
+        labelSeries = pd.Series(labels, index=deckIndex, name="Cluster")
+        included = (matrix > 0).astype(np.float32).tocsr()
+        # Lands, basics above all, are in most decks of every cluster, so they are
+        # left out of the characteristic cards and the suggested name
+        table = decks[0].oracleTable if decks else OracleTable.shared()
+        table.grow()
+        isLand = table.isLand[: matrix.shape[1]]
+        overallRate = np.asarray(included.sum(axis=0)).ravel() / max(len(decks), 1)
+        proposals = []
+        clusters, sizes = np.unique(labels[labels >= 0], return_counts=True)
+        for cluster, size in zip(clusters, sizes):
+            if size < minSize:
+                continue
+            members = np.flatnonzero(labels == cluster)
+            clusterRate = np.asarray(included[members].mean(axis=0)).ravel()
+            score = np.where(
+                (clusterRate >= 0.5) & ~isLand, clusterRate - overallRate, -np.inf
+            )
+            best = np.argsort(-score, kind="stable")[:top]
+            best = best[np.isfinite(score[best])]
+            characteristic = list(cardNames.names(best))
+            colour = pd.Series([decks[i].colour for i in members]).mode()[0]
+            proposals.append(
+                {
+                    "Cluster": cluster,
+                    "Decks": size,
+                    "Colour": colour,
+                    "Characteristic Cards": characteristic,
+                    "Suggested Archetype": (
+                        f"{colour} {characteristic[0]}" if characteristic else colour
+                    ),
+                }
+            )
+        proposalDf = pd.DataFrame(
+            proposals,
+            columns=[
+                "Cluster",
+                "Decks",
+                "Colour",
+                "Characteristic Cards",
+                "Suggested Archetype",
+            ],
+        )
+        proposalDf = proposalDf.sort_values("Decks", ascending=False)
+        return labelSeries, proposalDf.set_index("Cluster")
+
+    def jaccardMain(listOfUrls: list, mainSide: str = "Main"):
         deckDf = mtgoScrape.getDeckListsFromUrlList(listOfUrls)
         deckDf = mtgoScrape.removeCardIndex(deckDf)
-        decklist = dataAnalysis.getDeckLists(deckDf)
-        return decklist
+        return dataAnalysis.jaccardMatrix(deckDf, mainSide)
+
+
+class DeckIndex:
+    """Inverted index from card ID to the decks containing it, kept separately for
+    Main and Side as bitmaps over deck positions, so include/exclude filters are
+    bitmap intersections and differences.
+    """
+
+    def __init__(self, decks: list):
+        self.decks = list(decks)
+        self.allDecks = (1 << len(self.decks)) - 1
+        self.postings = {}
+        for mainSide in ["Main", "Side"]:
+            positions = {}
+            for i, deck in enumerate(self.decks):
+                for cardId in deck.uniqueCardIds[mainSide]:
+                    positions.setdefault(cardId, []).append(i)
+            self.postings[mainSide] = {
+                cardId: self.toBitmap(x) for cardId, x in positions.items()
+            }
+
+    def toBitmap(self, positions):
+        mask = np.zeros(len(self.decks), dtype=bool)
+        mask[positions] = True
+        return int.from_bytes(np.packbits(mask, bitorder="little").tobytes(), "little")
+
+    def cardBitmap(self, cardName: str, mainSide: str):
+        cardId = cardNames.cardId(cardName, register=False)
+        return self.postings[mainSide].get(cardId, 0)
+
+    def match(self, includedCards, mainSide1, excludedCards, mainSide2):
+        """Bitmap of the decks with all includedCards and none of excludedCards."""
+        bitmap = self.allDecks
+        for card in includedCards:
+            bitmap &= self.cardBitmap(card, mainSide1)
+        for card in excludedCards:
+            bitmap &= ~self.cardBitmap(card, mainSide2)
+        return bitmap
+
+    def decksFor(self, bitmap: int):
+        byteCount = (len(self.decks) + 7) // 8
+        mask = np.unpackbits(
+            np.frombuffer(bitmap.to_bytes(byteCount, "little"), dtype=np.uint8),
+            bitorder="little",
+        )[: len(self.decks)]
+        return [self.decks[i] for i in np.flatnonzero(mask)]
+
+
+class ArchetypeAggregates:
+    """Per-archetype card totals for Main and Side, built by grouping the decks by
+    deckName once and updated incrementally with `add` as tournaments come in.
+    """
+
+    def __init__(self, decks: list = ()):
+        self.decks = {}
+        self.counts = {}
+        self.add(decks)
+
+    def add(self, decks: list):
+        """Adds decks to the aggregates, only counting the new decks.
+
+        The new decks' card arrays are counted together, keyed on (archetype,
+        board, card ID), with one bincount for quantities and one for decks.
+        """
+        decks = list(decks)
+        if len(decks) == 0:
+            return
+        archetypeCodes, archetypeNames = pd.factorize(
+            pd.Series([x.deckName for x in decks], dtype=object)
+        )
+        cardIds, quantities, isSide, positions = Deck.concatArrays(decks)
+        idCount = max(len(cardNames._names), 1)
+        keys = (archetypeCodes[positions] * 2 + isSide) * idCount + cardIds
+        keys, inverse = np.unique(keys, return_inverse=True)
+        keyArchetypes, keyCards = np.divmod(keys, 2 * idCount)
+        keySides, keyCards = np.divmod(keyCards, idCount)
+        countsDf = pd.DataFrame(
+            {
+                "Main/Side": np.where(keySides == 1, "Side", "Main"),
+                "Card Name": cardNames.names(keyCards),
+                "Quantity": np.bincount(inverse, weights=quantities).astype(np.int64),
+                "Decks": np.bincount(inverse).astype(np.int64),
+            }
+        ).set_index(["Main/Side", "Card Name"])
+        bounds = np.searchsorted(keyArchetypes, np.arange(len(archetypeNames) + 1))
+        for code, archetypeName in enumerate(archetypeNames):
+            counts = countsDf.iloc[bounds[code] : bounds[code + 1]].sort_index()
+            if archetypeName in self.counts:
+                counts = self.counts[archetypeName].add(counts, fill_value=0)
+            self.counts[archetypeName] = counts.astype(int)
+        for deck in decks:
+            self.decks.setdefault(deck.deckName, []).append(deck)
+
+    def deckCount(self, archetypeName: str):
+        return len(self.decks.get(archetypeName, []))
+
+    def cardTable(self, archetypeName: str, mainSide: str):
+        """Card totals for one archetype and board.
+
+        Returns:
+            DataFrame: Indexed by Card Name, with total Quantity, number of Decks playing the card, Average copies per deck and Inclusion rate, sorted by Quantity
+        """
+        if archetypeName not in self.counts:
+            raise KeyError(f"No decks for archetype {archetypeName}")
+        counts = self.counts[archetypeName]
+        if mainSide in counts.index.get_level_values("Main/Side"):
+            df = counts.xs(mainSide, level="Main/Side").copy()
+        else:
+            df = counts.iloc[:0].droplevel("Main/Side").copy()
+        deckCount = self.deckCount(archetypeName)
+        df["Average"] = df["Quantity"] / deckCount
+        df["Inclusion"] = df["Decks"] / deckCount
+        return df.sort_values("Quantity", ascending=False)
 
 
 class Queries:
     def __init__(self):
         return
 
-    def filterArchetype(decks, archetypeName, mainSide):
-        filteredDecks = [
-            deck.deckDf[deck.deckDf["Main/Side"] == mainSide]
-            for deck in decks
-            if deck.deckName == archetypeName
-        ]
-        df = pd.concat(filteredDecks)
+    def buildAggregates(decks):
+        """Groups decks by archetype once for the *Archetype queries."""
+        return ArchetypeAggregates(decks)
+
+    def filterArchetype(decks, archetypeName, mainSide, aggregates=None):
+        if aggregates is None:
+            aggregates = ArchetypeAggregates(
+                [deck for deck in decks if deck.deckName == archetypeName]
+            )
+        df = Deck.concatDf(aggregates.decks[archetypeName], mainSide)
         df = df.reset_index()
         return df
 
-    def avgArchetype(decks, archetypeName, mainSide):
-        filteredDecks = [
-            deck.deckDf[deck.deckDf["Main/Side"] == mainSide]
-            for deck in decks
-            if deck.deckName == archetypeName
-        ]
-        df = pd.concat(filteredDecks)
-        tempDf = df.reset_index()
-        tempDf = tempDf.groupby("Card Name")["Quantity"].sum().sort_values(
-            ascending=False
-        ) / len(filteredDecks)
-        return df
+    def avgArchetype(decks, archetypeName, mainSide, aggregates=None):
+        if aggregates is None:
+            aggregates = ArchetypeAggregates(
+                [deck for deck in decks if deck.deckName == archetypeName]
+            )
+        return aggregates.cardTable(archetypeName, mainSide)["Average"]
 
-    def aggArchetype(decks, archetypeName, mainSide):
-        filteredDecks = [
-            deck.deckDf[deck.deckDf["Main/Side"] == mainSide]
-            for deck in decks
-            if deck.deckName == archetypeName
-        ]
-        df = pd.concat(filteredDecks)
-        tempDf = df.reset_index()
-        tempDf = (
-            tempDf.groupby("Card Name")["Quantity"].sum().sort_values(ascending=False)
+    def aggArchetype(decks, archetypeName, mainSide, aggregates=None):
+        if aggregates is None:
+            aggregates = ArchetypeAggregates(
+                [deck for deck in decks if deck.deckName == archetypeName]
+            )
+        return aggregates.cardTable(archetypeName, mainSide)["Quantity"]
+
+    def cardQuantities(decks, mainSide):
+        """Total copies of each card on one board of decks, from the card arrays.
+
+        Returns:
+            Series: Quantity indexed by Card Name, most played first
+        """
+        cardIds, quantities, isSide, _ = Deck.concatArrays(decks)
+        onBoard = isSide == (mainSide == "Side")
+        totals = np.bincount(cardIds[onBoard], weights=quantities[onBoard])
+        totals = totals.astype(np.int64)
+        playedIds = np.flatnonzero(totals)
+        names = cardNames.names(playedIds)
+        order = np.argsort(names, kind="stable")
+        order = order[np.argsort(-totals[playedIds][order], kind="stable")]
+        return pd.Series(
+            totals[playedIds][order],
+            index=pd.Index(names[order], name="Card Name"),
+            name="Quantity",
         )
-        return df
 
-    def filterDecksWithCard(
-        decks, includedCards, mainSide1, excludedCards, mainSide2, mainSide
+    def buildIndex(decks):
+        """Builds the card -> decks index used to speed up the *DecksWithCard queries."""
+        return DeckIndex(decks)
+
+    def decksWithCard(
+        decks, includedCards, mainSide1, excludedCards, mainSide2, index=None
     ):
-        filteredDecks = [
-            deck.deckDf[deck.deckDf["Main/Side"] == mainSide]
+        """Decks with all of includedCards in mainSide1 and none of excludedCards in mainSide2.
+
+        Args:
+            index (DeckIndex, optional): Index built from the same decks. Defaults to scanning every deck.
+        """
+        if index is not None:
+            return index.decksFor(
+                index.match(includedCards, mainSide1, excludedCards, mainSide2)
+            )
+        includedIds = [cardNames.cardId(x, register=False) for x in includedCards]
+        excludedIds = [cardNames.cardId(x, register=False) for x in excludedCards]
+        return [
+            deck
             for deck in decks
-            if all(card in deck.uniqueCards[mainSide1] for card in includedCards)
-            if not any(card in deck.uniqueCards[mainSide2] for card in excludedCards)
+            if all(x in deck.uniqueCardIds[mainSide1] for x in includedIds)
+            if not any(x in deck.uniqueCardIds[mainSide2] for x in excludedIds)
         ]
-        df = pd.concat(filteredDecks)
+
+    def filterDecksWithCard(
+        decks,
+        includedCards,
+        mainSide1,
+        excludedCards,
+        mainSide2,
+        mainSide,
+        index=None,
+    ):
+        filteredDecks = Queries.decksWithCard(
+            decks, includedCards, mainSide1, excludedCards, mainSide2, index
+        )
+        df = Deck.concatDf(filteredDecks, mainSide)
         df = df.reset_index()
         return df
 
     def avgDecksWithCard(
-        decks, includedCards, mainSide1, excludedCards, mainSide2, mainSide
+        decks,
+        includedCards,
+        mainSide1,
+        excludedCards,
+        mainSide2,
+        mainSide,
+        index=None,
     ):
-        filteredDecks = [
-            deck.deckDf[deck.deckDf["Main/Side"] == mainSide]
-            for deck in decks
-            if all(card in deck.uniqueCards[mainSide1] for card in includedCards)
-            if not any(card in deck.uniqueCards[mainSide2] for card in excludedCards)
-        ]
-        df = pd.concat(filteredDecks)
-        df = df.reset_index()
-        df = round(
-            df.groupby("Card Name")["Quantity"].sum().sort_values(ascending=False)
-            / len(filteredDecks),
-            2,
+        filteredDecks = Queries.decksWithCard(
+            decks, includedCards, mainSide1, excludedCards, mainSide2, index
         )
-        return df
+        quantities = Queries.cardQuantities(filteredDecks, mainSide)
+        return round(quantities / max(len(filteredDecks), 1), 2)
 
     def aggDecksWithCard(
-        decks, includedCards, mainSide1, excludedCards, mainSide2, mainSide
+        decks,
+        includedCards,
+        mainSide1,
+        excludedCards,
+        mainSide2,
+        mainSide,
+        index=None,
     ):
-        filteredDecks = [
-            deck.deckDf[deck.deckDf["Main/Side"] == mainSide]
-            for deck in decks
-            if all(card in deck.uniqueCards[mainSide1] for card in includedCards)
-            if not any(card in deck.uniqueCards[mainSide2] for card in excludedCards)
-        ]
-        df = pd.concat(filteredDecks)
-        df = df.reset_index()
-        df = round(
-            df.groupby("Card Name")["Quantity"].sum().sort_values(ascending=False),
-            2,
+        filteredDecks = Queries.decksWithCard(
+            decks, includedCards, mainSide1, excludedCards, mainSide2, index
         )
-        return df
+        return Queries.cardQuantities(filteredDecks, mainSide)
 
 
-class Deck:
-    def __init__(self, deckDataFrame, qf):  # qf = Query Format
-        keyCardMapping = {
-            "standard": standardKeyCardList,
-            "pioneer": pioneerKeyCardList,
-            "pauper": pauperKeyCardList,
-            "modern": modernKeyCardList
-        }
-        keyCards = keyCardMapping.get(qf)
-        deckDataFrame = deckDataFrame.sort_values(by="Quantity", ascending=False)
-        self.deckDf = deckDataFrame
-        self.uniqueCards = {
-            "Main": list(
-                deckDataFrame[deckDataFrame["Main/Side"] == "Main"]["Card Name"]
+class ArchetypeRules:
+    """Archetype signatures for one format, compiled to card ID checks that are
+    evaluated over every deck at once.
+
+    Rules are read from `archetypes/<format>.json` when that file exists, and are
+    otherwise made from the format's key card list in config.py, one rule per key
+    card in list order. Each rule has an "archetype" name and optionally:
+
+        "priority": lower numbers win when several rules match (default: file order)
+        "required": {card name: minimum copies}
+        "forbidden": [card names that must not be played]
+        "colours": colours the deck must include, e.g. "UR"
+        "excludedColours": colours the deck must not include
+        "board": where cards are counted, "Main" (default), "Side" or "Deck"
+
+    Decks matching no rule fall back to land count thresholds, set with
+    "fallback": {"aggroBelow": 22, "controlAbove": 26}.
+    """
+
+    keyCardMapping = {
+        "standard": standardKeyCardList,
+        "pioneer": pioneerKeyCardList,
+        "pauper": pauperKeyCardList,
+        "modern": modernKeyCardList,
+        "legacy": legacyKeyCardList,
+    }
+    # Where load looks for <format>.json, e.g. fixtures/archetypes in the benchmark
+    directory = archetypesDir
+    _loaded = {}
+
+    def __init__(self, rules: list, fallback=None):
+        self.rules = sorted(
+            [dict(x, order=i) for i, x in enumerate(rules)],
+            key=lambda x: (x.get("priority", x["order"]), x["order"]),
+        )
+        self.fallback = {"aggroBelow": 22, "controlAbove": 26, **(fallback or {})}
+        self._compiled = None
+        self._compiledSize = None
+
+    def load(qf: str):
+        """Rules for a format, read once per session and rules directory."""
+        key = (ArchetypeRules.directory, qf)
+        if key not in ArchetypeRules._loaded:
+            path = os.path.join(ArchetypeRules.directory, f"{qf}.json")
+            if os.path.exists(path):
+                with open(path, "r") as f:
+                    ruleFile = json.load(f)
+                rules = ArchetypeRules(ruleFile["rules"], ruleFile.get("fallback"))
+            else:
+                rules = ArchetypeRules.fromKeyCards(
+                    ArchetypeRules.keyCardMapping.get(qf, [])
+                )
+            ArchetypeRules._loaded[key] = rules
+        return ArchetypeRules._loaded[key]
+
+    def fromKeyCards(keyCards: list):
+        return ArchetypeRules(
+            [
+                {"archetype": mtgKeyToArchetypeDict.get(x, x), "required": {x: 1}}
+                for x in keyCards
+            ]
+        )
+
+    def colourMaskOf(colours: str):
+        return OracleTable.colourMaskOf(colours or "")
+
+    def fallbackArchetype(self, landcount: int):
+        if landcount < self.fallback["aggroBelow"]:
+            return "Aggro"
+        elif landcount > self.fallback["controlAbove"]:
+            return "Control"
+        return ""
+
+    def compiled(self):
+        """The rules resolved to card IDs and colour masks.
+
+        Redone only when cardNames has grown since, as that is the only way a
+        rule card's ID can change (from unknown to registered).
+
+        Returns:
+            dict: Per rule arrays (requiredMask, excludedMask, requiredCount,
+            possible, and the required card names as codes into keyCardNames) and
+            per condition arrays sorted by key, where a key is
+            board * card count + card ID (ruleOf, minCopies, forbidden)
+        """
+        size = len(cardNames._names)
+        if self._compiledSize == size:
+            return self._compiled
+        boardCodes = {"Main": 0, "Side": 1, "Deck": 2}
+        conditions = []
+        requiredCount = np.zeros(len(self.rules), dtype=np.int64)
+        possible = np.ones(len(self.rules), dtype=bool)
+        for i, rule in enumerate(self.rules):
+            board = boardCodes[rule.get("board", "Main")]
+            for card, minCopies in rule.get("required", {}).items():
+                if minCopies <= 0:
+                    continue
+                cardId = cardNames.cardId(card, register=False)
+                if cardId < 0:
+                    possible[i] = False
+                    continue
+                conditions.append((board * size + cardId, i, minCopies, False))
+                requiredCount[i] += 1
+            for card in rule.get("forbidden", []):
+                cardId = cardNames.cardId(card, register=False)
+                if cardId >= 0:
+                    conditions.append((board * size + cardId, i, 0, True))
+        conditions.sort()
+        keyCardCodes, keyCardNames = pd.factorize(
+            pd.Series(
+                [x for rule in self.rules for x in rule.get("required", {})],
+                dtype=object,
+            )
+        )
+        keyCardNames = np.asarray(keyCardNames, dtype=object)
+        keyCardCounts = np.array(
+            [len(x.get("required", {})) for x in self.rules], dtype=np.int64
+        )
+        columns = list(zip(*conditions)) if conditions else [[], [], [], []]
+        self._compiled = {
+            "requiredMask": np.array(
+                [ArchetypeRules.colourMaskOf(x.get("colours")) for x in self.rules],
+                dtype=np.int64,
+            ),
+            "excludedMask": np.array(
+                [
+                    ArchetypeRules.colourMaskOf(x.get("excludedColours"))
+                    for x in self.rules
+                ],
+                dtype=np.int64,
             ),
-            "Side": list(
-                deckDataFrame[deckDataFrame["Main/Side"] == "Side"]["Card Name"]
+            "requiredCount": requiredCount,
+            "possible": possible,
+            "keyCardNames": keyCardNames,
+            "keyCardCodes": keyCardCodes.astype(np.int64),
+            "keyCardStarts": np.cumsum(keyCardCounts) - keyCardCounts,
+            "keyCardCounts": keyCardCounts,
+            "keys": np.array(columns[0], dtype=np.int64),
+            "ruleOf": np.array(columns[1], dtype=np.int64),
+            "minCopies": np.array(columns[2], dtype=np.int64),
+            "forbidden": np.array(columns[3], dtype=bool),
+            "isRuleCard": np.isin(
+                np.arange(size), np.array(columns[0], dtype=np.int64) % max(size, 1)
             ),
         }
+        self._compiledSize = size
+        return self._compiled
+
+    def classifyDeck(
+        self, cardIds, quantities, isSide, colourMask: int, landcount: int
+    ):
+        """Single-deck version of classify, for building one Deck at a time.
+
+        Returns:
+            tuple: (key card list, archetype name)
+        """
+        keyCards, archetypes = self.classify(
+            np.zeros(len(cardIds), dtype=np.int64),
+            cardIds,
+            quantities,
+            isSide,
+            np.array([colourMask], dtype=np.int64),
+            np.array([landcount]),
+        )
+        return keyCards[0], archetypes[0]
+
+    def classify(self, deckCodes, cardIds, quantities, isSide, colourMask, landCount):
+        """Evaluates every rule over all decks.
+
+        Only the decks' rows for cards some rule names are counted, per board.
+        Those counts are joined to the compiled conditions, so the work follows
+        the rule cards decks actually play, not the number of rules.
+
+        Args:
+            deckCodes (ndarray): Deck number of each card row
+            cardIds, quantities, isSide (ndarray): Card rows, as from mtgoScrape.deckArrays
+            colourMask (ndarray): WUBRG bitmask per deck
+            landCount (ndarray): Land count per deck
+
+        Returns:
+            tuple: (list of key card lists, list of archetype names), one entry per deck
+        """
+        compiled = self.compiled()
+        size = len(cardNames._names)
+        ruleCount = max(len(self.rules), 1)
+        deckCount = len(colourMask)
+        colourMask = np.asarray(colourMask, dtype=np.int64)
+
+        # Copies of each rule card per (deck, board), with "Deck" as board 2
+        rows = np.flatnonzero(compiled["isRuleCard"][cardIds])
+        rowBoards = np.concatenate(
+            [isSide[rows].astype(np.int64), np.full(len(rows), 2)]
+        )
+        rows = np.concatenate([rows, rows])
+        entryKeys, inverse = np.unique(
+            deckCodes[rows].astype(np.int64) * (3 * size)
+            + rowBoards * size
+            + cardIds[rows],
+            return_inverse=True,
+        )
+        entryCounts = np.bincount(inverse, weights=quantities[rows])
+        entryDecks, entryKeys = np.divmod(entryKeys, 3 * size)
+
+        # Every (entry, condition) pair on the same board and card
+        lower = np.searchsorted(compiled["keys"], entryKeys, "left")
+        upper = np.searchsorted(compiled["keys"], entryKeys, "right")
+        pairCounts = upper - lower
+        entryOfPair = np.repeat(np.arange(len(entryKeys)), pairCounts)
+        conditionOfPair = (
+            np.arange(pairCounts.sum())
+            - np.repeat(np.cumsum(pairCounts) - pairCounts, pairCounts)
+            + np.repeat(lower, pairCounts)
+        )
+        pairKeys = (
+            entryDecks[entryOfPair] * ruleCount + compiled["ruleOf"][conditionOfPair]
+        )
+        forbidden = compiled["forbidden"][conditionOfPair]
+        satisfied = ~forbidden & (
+            entryCounts[entryOfPair] >= compiled["minCopies"][conditionOfPair]
+        )
+        forbiddenKeys = np.unique(pairKeys[forbidden])
+
+        def colourOk(decks, rules):
+            required = compiled["requiredMask"][rules]
+            return ((colourMask[decks] & required) == required) & (
+                (colourMask[decks] & compiled["excludedMask"][rules]) == 0
+            )
+
+        # A (deck, rule) matches when all its required conditions hold, the
+        # colours fit and no forbidden card is played
+        metKeys, metCounts = np.unique(pairKeys[satisfied], return_counts=True)
+        matchKeys = metKeys[metCounts == compiled["requiredCount"][metKeys % ruleCount]]
+        # Rules whose required cards all need 0 copies match on colour alone
+        zeroCopyRules = np.flatnonzero(
+            compiled["possible"]
+            & (compiled["requiredCount"] == 0)
+            & (compiled["keyCardCounts"] > 0)
+        )
+        matchKeys = np.concatenate(
+            [
+                matchKeys,
+                (np.arange(deckCount)[:, None] * ruleCount + zeroCopyRules).ravel(),
+            ]
+        )
+        matchKeys = np.sort(matchKeys[~np.isin(matchKeys, forbiddenKeys)])
+        matchDecks, matchRules = np.divmod(matchKeys, ruleCount)
+        keep = compiled["possible"][matchRules] & colourOk(matchDecks, matchRules)
+        matchDecks, matchRules = matchDecks[keep], matchRules[keep]
+
+        # Rules are in priority order, so each deck's first match names it
+        assigned = np.full(deckCount, ruleCount, dtype=np.int64)
+        firstMatches = np.flatnonzero(np.diff(matchDecks, prepend=-1) != 0)
+        assigned[matchDecks[firstMatches]] = matchRules[firstMatches]
+        # Rules without any required card only matter when they come first.
+        # Most decks settle on the first one whose colours fit.
+        pending = np.arange(deckCount)
+        for rule in np.flatnonzero(
+            compiled["possible"]
+            & (compiled["requiredCount"] == 0)
+            & (compiled["keyCardCounts"] == 0)
+        ):
+            pending = pending[assigned[pending] > rule]
+            if len(pending) == 0:
+                break
+            fits = colourOk(pending, rule) & ~np.isin(
+                pending * ruleCount + rule, forbiddenKeys
+            )
+            assigned[pending[fits]] = rule
+        archetypes = [
+            self.rules[x]["archetype"] if x < ruleCount else self.fallbackArchetype(y)
+            for x, y in zip(assigned.tolist(), landCount)
+        ]
+
+        # Key cards are the required cards of every matching rule, in rule
+        # order, each once
+        starts = compiled["keyCardStarts"]
+        lengths = compiled["keyCardCounts"][matchRules]
+        tokenDecks = np.repeat(matchDecks, lengths)
+        tokenCards = compiled["keyCardCodes"][
+            np.arange(lengths.sum())
+            - np.repeat(np.cumsum(lengths) - lengths, lengths)
+            + np.repeat(starts[matchRules], lengths)
+        ]
+        _, firstTokens = np.unique(
+            tokenDecks * len(compiled["keyCardNames"]) + tokenCards, return_index=True
+        )
+        firstTokens.sort()
+        names = compiled["keyCardNames"][tokenCards[firstTokens]].tolist()
+        bounds = np.concatenate(
+            [[0], np.cumsum(np.bincount(tokenDecks[firstTokens], minlength=deckCount))]
+        ).tolist()
+        keyCards = [names[x:y] for x, y in zip(bounds[:-1], bounds[1:])]
+        return keyCards, archetypes
+
+
+class OracleTable:
+    """Card attributes indexed by card ID, built once from the oracle and shared by
+    every Deck, with the columns the deck classification needs as NumPy arrays.
+    """
+
+    _shared = None
+
+    def __init__(self, oracleDf):
+        self.source = oracleDf
+        ids = cardNames.cardIds(oracleDf["name"])
+        attributes = oracleDf[scryKeepCols].drop(columns=["name"]).set_axis(ids)
+        self.attributes = attributes[~attributes.index.duplicated()].sort_index()
+        size = len(cardNames._names)
+        self.isLand = np.zeros(size, dtype=bool)
+        self.cmc = np.full(size, np.nan)
+        self.colourMask = np.zeros(size, dtype=np.uint8)
+        cardIds = self.attributes.index.to_numpy()
+        typeLines = self.attributes["type_line"]
+        self.isLand[cardIds] = (
+            typeLines.str.contains("Land").fillna(False).to_numpy(bool)
+        )
+        self.cmc[cardIds] = pd.to_numeric(self.attributes["cmc"], errors="coerce")
+        manaCodes, manaCosts = pd.factorize(self.attributes["mana_cost"])
+        masks = np.array(
+            [OracleTable.colourMaskOf(x) for x in manaCosts] + [0], dtype=np.uint8
+        )
+        self.colourMask[cardIds] = masks[manaCodes]
+
+    def shared(oracleDf=None):
+        """The session's table. Passing an oracle makes it the session's table,
+        rebuilt only when a different oracle is passed. Without one, the current
+        table is reused, and the first call builds it from oracle.expandedClean.
+        """
+        if oracleDf is None:
+            if OracleTable._shared is not None:
+                return OracleTable._shared
+            oracleDf = oracle.expandedClean()
+        if OracleTable._shared is None or OracleTable._shared.source is not oracleDf:
+            OracleTable._shared = OracleTable(oracleDf)
+        return OracleTable._shared
+
+    def colourMaskOf(manaCost: str):
+        mask = 0
+        for i, colour in enumerate(identifyDeck.custom_order):
+            if colour in manaCost:
+                mask |= 1 << i
+        return mask
+
+    def colourName(mask: int):
+        colours = "".join(
+            x for i, x in enumerate(identifyDeck.custom_order) if mask & (1 << i)
+        )
+        return mtgColourComboNameDict[colours]
+
+    def saveArrays(self, directory: str):
+        """Writes the arrays and the card names they are indexed by, for loadArrays."""
+        self.grow()
+        np.save(os.path.join(directory, "isLand.npy"), self.isLand)
+        np.save(os.path.join(directory, "cmc.npy"), self.cmc)
+        np.save(os.path.join(directory, "colourMask.npy"), self.colourMask)
+        with open(os.path.join(directory, "cardNames.json"), "w") as f:
+            json.dump(cardNames._names[: len(self.isLand)], f)
+        self.baseSize = len(self.isLand)
+
+    def loadArrays(directory: str):
+        """A table over arrays written by saveArrays, memory-mapped read-only so
+        processes share one copy. The card names are registered first, so this
+        process gives them the same IDs as the writer. Card attributes are not
+        loaded, so it is only fit for classification.
+        """
+        with open(os.path.join(directory, "cardNames.json"), "r") as f:
+            names = json.load(f)
+        ids = cardNames.cardIds(names)
+        if not np.array_equal(ids, np.arange(len(names))):
+            raise ValueError("Card IDs were registered before loading the table.")
+        table = OracleTable.__new__(OracleTable)
+        table.source = None
+        table.attributes = None
+        table.baseSize = len(names)
+        for name in ["isLand", "cmc", "colourMask"]:
+            array = np.load(os.path.join(directory, f"{name}.npy"), mmap_mode="r")
+            setattr(table, name, array)
+        return table
+
+    def grow(self):
+        """Extends the arrays to cover card IDs registered after the table was built."""
+        missing = len(cardNames._names) - len(self.isLand)
+        if missing > 0:
+            self.isLand = np.concatenate([self.isLand, np.zeros(missing, dtype=bool)])
+            self.cmc = np.concatenate([self.cmc, np.full(missing, np.nan)])
+            self.colourMask = np.concatenate(
+                [self.colourMask, np.zeros(missing, dtype=np.uint8)]
+            )
+
+
+class Deck:
+    """One decklist, stored as card ID, quantity and sideboard flag arrays. Card
+    attributes come from the shared OracleTable, and deckDf is built on first
+    access and kept. Deck.concatDf builds the frame of many decks in one join.
+    """
+
+    __slots__ = (
+        "deckId",
+        "cardIds",
+        "quantities",
+        "isSide",
+        "oracleTable",
+        "colour",
+        "keyCard",
+        "landcount",
+        "avgcmc",
+        "archetype",
+        "deckName",
+        "_deckDf",
+    )
+
+    def __init__(self, deckDataFrame, qf, table=None):  # qf = Query Format
+        if "Card ID" in deckDataFrame.columns:
+            cardIds = deckDataFrame["Card ID"].to_numpy(np.int32)
+        else:
+            cardIds = cardNames.cardIds(deckDataFrame["Card Name"]).astype(np.int32)
         self.deckId = deckDataFrame.index.unique()[0]
-        self.colour = mtgColourComboNameDict[identifyDeck.getDeckColour(self.deckDf)]
-        self.keyCard = [x for x in keyCards if x in self.uniqueCards["Main"]]
-        self.landcount = int(
-            deckDataFrame[deckDataFrame["type_line"].str.contains("Land")][
-                "Quantity"
-            ].sum()
-        )
-        self.avgcmc = float(
-            deckDataFrame[~deckDataFrame["type_line"].str.contains("Land")][
-                "cmc"
-            ].mean()
+        self.setCards(
+            cardIds,
+            deckDataFrame["Quantity"].to_numpy(np.int16),
+            (deckDataFrame["Main/Side"] == "Side").to_numpy(),
+            qf,
+            table,
         )
-        try:
-            self.archetype = mtgKeyToArchetypeDict[self.keyCard[0]]
-        except IndexError:
-            if self.landcount < 22:
-                self.archetype = "Aggro"
-            elif self.landcount > 26:
-                self.archetype = "Control"
-            else:
-                self.archetype = ""
-        self.deckName = f"{self.colour} {self.archetype}"
-        return
+
+    def fromArrays(deckId, cardIds, quantities, isSide, qf, table=None):
+        deck = Deck.__new__(Deck)
+        deck.deckId = deckId
+        deck.setCards(cardIds, quantities, isSide, qf, table)
+        return deck
+
+    def fromSummary(deckId, cardIds, quantities, isSide, summary, table):
+        """Builds a Deck from a row of mtgoScrape.classifyDecks without re-classifying it."""
+        deck = Deck.__new__(Deck)
+        deck.deckId = deckId
+        deck.setSummary(cardIds, quantities, isSide, summary, table)
+        return deck
+
+    def setSummary(self, cardIds, quantities, isSide, summary, table):
+        self.cardIds = cardIds
+        self.quantities = quantities
+        self.isSide = isSide
+        self.oracleTable = table
+        self._deckDf = None
+        self.colour = summary[0]
+        self.keyCard = list(summary[1])
+        self.landcount = int(summary[2])
+        self.avgcmc = float(summary[3])
+        self.archetype = summary[4]
+        self.deckName = summary[5]
+
+    def setCards(self, cardIds, quantities, isSide, qf, table=None):
+        if table is None:
+            table = OracleTable.shared()
+        table.grow()
+        isLand = table.isLand[cardIds]
+        colourMask = int(np.bitwise_or.reduce(table.colourMask[cardIds], initial=0))
+        landcount = int(quantities[isLand].sum())
+        cmc = table.cmc[cardIds[~isLand]]
+        cmc = cmc[~np.isnan(cmc)]
+        avgcmc = float(cmc.mean()) if len(cmc) > 0 else float("nan")
+        keyCard, archetype = ArchetypeRules.load(qf).classifyDeck(
+            cardIds, quantities, isSide, colourMask, landcount
+        )
+        colour = OracleTable.colourName(colourMask)
+        summary = (
+            colour,
+            keyCard,
+            landcount,
+            avgcmc,
+            archetype,
+            f"{colour} {archetype}",
+        )
+        self.setSummary(cardIds, quantities, isSide, summary, table)
+
+    @property
+    def uniqueCardIds(self):
+        return {
+            "Main": set(self.cardIds[~self.isSide].tolist()),
+            "Side": set(self.cardIds[self.isSide].tolist()),
+        }
+
+    @property
+    def uniqueCards(self):
+        order = np.argsort(-self.quantities, kind="stable")
+        isSide = self.isSide[order]
+        names = cardNames.names(self.cardIds[order])
+        return {"Main": list(names[~isSide]), "Side": list(names[isSide])}
+
+    def concatArrays(decks: list):
+        """The card arrays of every deck, end to end.
+
+        Returns:
+            tuple: (cardIds, quantities, isSide, position of each row's deck in decks)
+        """
+        if len(decks) == 0:
+            return (
+                np.zeros(0, dtype=np.int32),
+                np.zeros(0, dtype=np.int16),
+                np.zeros(0, dtype=bool),
+                np.zeros(0, dtype=np.int64),
+            )
+        lengths = [len(x.cardIds) for x in decks]
+        return (
+            np.concatenate([x.cardIds for x in decks]),
+            np.concatenate([x.quantities for x in decks]),
+            np.concatenate([x.isSide for x in decks]),
+            np.repeat(np.arange(len(decks)), lengths),
+        )
+
+    def concatDf(decks: list, mainSide=None, attributes: bool = True):
+        """The cards of many decks as one frame, the same as concatenating each
+        deck's deckDf (or cardsDf without attributes), with one oracle join.
+
+        Args:
+            decks (list): Deck objects
+            mainSide (str, optional): Keep only "Main" or "Side" rows. Defaults to both.
+            attributes (bool, optional): Join the oracle attributes. Defaults to True.
+        """
+        cardIds, quantities, isSide, positions = Deck.concatArrays(decks)
+        rows = np.arange(len(cardIds))
+        if mainSide is not None:
+            rows = rows[isSide == (mainSide == "Side")]
+        # Per deck by descending quantity, ties in card order, as cardsDf sorts
+        rows = rows[np.lexsort((rows, -quantities[rows], positions[rows]))]
+        deckIds = [x.deckId for x in decks]
+        df = pd.DataFrame(
+            {
+                "Main/Side": np.where(isSide[rows], "Side", "Main"),
+                "Card Name": cardNames.names(cardIds[rows]),
+                "Quantity": quantities[rows].astype(np.int64),
+                "Card ID": cardIds[rows].astype(np.int64),
+            },
+            index=pd.MultiIndex.from_arrays(
+                [
+                    [deckIds[i][0] for i in positions[rows]],
+                    [deckIds[i][1] for i in positions[rows]],
+                ],
+                names=["Deck URL", "Deck"],
+            ),
+        )
+        if attributes and len(decks) > 0:
+            table = decks[0].oracleTable
+            joined = table.attributes.reindex(df["Card ID"].to_numpy())
+            for col in joined.columns:
+                df[col] = joined[col].to_numpy()
+        return df
+
+    def cardsDf(self):
+        """Main/Side, Card Name, Quantity and Card ID of every card, without oracle columns."""
+        return Deck.concatDf([self], attributes=False)
+
+    @property
+    def deckDf(self):
+        """The deck's cards joined with their oracle attributes, built once."""
+        if self._deckDf is None:
+            self._deckDf = Deck.concatDf([self])
+        return self._deckDf
+
+
+# Everything public, plus the lazily imported `plt` the notebooks use
+__all__ = [x for x in list(globals()) if not x.startswith("_")] + ["plt"]  # noqa: F822
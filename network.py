@@ -0,0 +1,228 @@
+## Imports
+
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+
+import requests
+from requests.adapters import HTTPAdapter
+from requests.structures import CaseInsensitiveDict
+from urllib3.util.retry import Retry
+
+from instrumentation import instrumentation
+
+## Local Caches
+
+httpCacheDir = "HTTP Cache"
+httpRecordDir = "HTTP Recordings"
+
+## Network
+
+
+class ReplayMissError(requests.ConnectionError):
+    """Raised in replay mode for a URL with no recorded response."""
+
+
+class network:
+    """Every HTTP request of the scraper goes through here.
+
+    One pooled session with retry/backoff is shared by all threads, and at most
+    `maxConcurrent` requests are in flight at once. Responses fetched with a `ttl`
+    are kept under `httpCacheDir`. They are served from disk while fresh, then
+    revalidated with ETag/Last-Modified, and served stale if the site is
+    unreachable.
+
+    The mode comes from the MTGO_HTTP_MODE environment variable or setMode:
+        "live"    fetch normally (default)
+        "record"  fetch normally, and save every response under `recordDir`
+        "replay"  serve only saved responses, never touching the network
+    """
+
+    mode = os.environ.get("MTGO_HTTP_MODE", "live")
+    recordDir = os.environ.get("MTGO_HTTP_RECORD_DIR", httpRecordDir)
+    cacheDir = httpCacheDir
+    maxConcurrent = 8
+
+    _session = None
+    _lock = threading.Lock()
+    _slots = threading.BoundedSemaphore(maxConcurrent)
+
+    def setMode(mode: str, recordDir=None):
+        if mode not in ("live", "record", "replay"):
+            raise ValueError(f"Unknown network mode {mode}.")
+        network.mode = mode
+        if recordDir is not None:
+            network.recordDir = recordDir
+
+    def setConcurrency(maxConcurrent: int):
+        network.maxConcurrent = maxConcurrent
+        network._slots = threading.BoundedSemaphore(maxConcurrent)
+
+    def session():
+        """Shared requests session with pooled connections and retry/backoff."""
+        with network._lock:
+            if network._session is None:
+                retry = Retry(
+                    total=5,
+                    backoff_factor=0.5,
+                    status_forcelist=[429, 500, 502, 503, 504],
+                    allowed_methods=["GET"],
+                )
+                adapter = HTTPAdapter(
+                    pool_connections=16, pool_maxsize=16, max_retries=retry
+                )
+                session = requests.Session()
+                session.mount("https://", adapter)
+                session.mount("http://", adapter)
+                network._session = session
+        return network._session
+
+    def entryPaths(directory: str, url: str):
+        """(body path, metadata path) of a URL's entry in a cache or recording directory."""
+        key = hashlib.sha1(url.encode("utf-8")).hexdigest()
+        return os.path.join(directory, f"{key}.body"), os.path.join(
+            directory, f"{key}.json"
+        )
+
+    def readEntry(directory: str, url: str):
+        bodyPath, metaPath = network.entryPaths(directory, url)
+        if not os.path.exists(metaPath) or not os.path.exists(bodyPath):
+            return None, None
+        with open(metaPath, "r") as f:
+            meta = json.load(f)
+        with open(bodyPath, "rb") as f:
+            return meta, f.read()
+
+    def entryMeta(url: str, response):
+        return {
+            "url": url,
+            "status": response.status_code,
+            "headers": dict(response.headers),
+            "fetched": time.time(),
+        }
+
+    def writeEntry(directory: str, url: str, meta: dict, body=None):
+        """Saves a response's metadata and, if given, its body. Files are replaced
+        atomically, so concurrent readers never see half an entry.
+        """
+        os.makedirs(directory, exist_ok=True)
+        bodyPath, metaPath = network.entryPaths(directory, url)
+        if body is not None:
+            tmpPath = f"{bodyPath}.{threading.get_ident()}.tmp"
+            with open(tmpPath, "wb") as f:
+                f.write(body)
+            os.replace(tmpPath, bodyPath)
+        tmpPath = f"{metaPath}.{threading.get_ident()}.tmp"
+        with open(tmpPath, "w") as f:
+            json.dump(meta, f)
+        os.replace(tmpPath, metaPath)
+
+    def fromEntry(url: str, meta: dict, body: bytes):
+        """Rebuilds a requests Response from a saved entry."""
+        response = requests.Response()
+        response.url = url
+        response.status_code = meta["status"]
+        response.headers = CaseInsensitiveDict(meta["headers"])
+        response.encoding = requests.utils.get_encoding_from_headers(response.headers)
+        response._content = body
+        return response
+
+    def replay(url: str):
+        meta, body = network.readEntry(network.recordDir, url)
+        if meta is None:
+            instrumentation.count("network.replayMiss")
+            raise ReplayMissError(f"No recorded response for {url}")
+        instrumentation.count("network.replayed")
+        return network.fromEntry(url, meta, body)
+
+    def fetch(url: str, headers=None, timeout: float = 30, stream=False):
+        with network._slots, instrumentation.timed("network.fetch"):
+            instrumentation.count("network.requests")
+            return network.session().get(
+                url, headers=headers, timeout=timeout, stream=stream
+            )
+
+    def get(url: str, ttl=None, timeout: float = 30):
+        """GETs a URL through the shared session, the response cache and the
+        record/replay store.
+
+        Args:
+            url (str): URL to fetch
+            ttl (float, optional): Seconds a cached response is served without
+                revalidation. Defaults to None, which does not cache the response.
+            timeout (float, optional): Request timeout in seconds. Defaults to 30.
+
+        Returns:
+            Response: A requests Response, possibly rebuilt from disk
+        """
+        if network.mode == "replay":
+            return network.replay(url)
+        meta, body = (None, None)
+        if ttl is not None:
+            meta, body = network.readEntry(network.cacheDir, url)
+        if meta is not None and time.time() - meta["fetched"] < ttl:
+            instrumentation.count("httpCache.fresh")
+            response = network.fromEntry(url, meta, body)
+        else:
+            headers = {}
+            if meta is not None and "ETag" in meta["headers"]:
+                headers["If-None-Match"] = meta["headers"]["ETag"]
+            if meta is not None and "Last-Modified" in meta["headers"]:
+                headers["If-Modified-Since"] = meta["headers"]["Last-Modified"]
+            try:
+                response = network.fetch(url, headers, timeout)
+            except requests.RequestException as e:
+                if meta is None:
+                    raise
+                logging.warning(f"{url} unreachable ({e}), using stale cached copy.")
+                instrumentation.count("httpCache.stale")
+                return network.fromEntry(url, meta, body)
+            if response.status_code == 304 and meta is not None:
+                instrumentation.count("httpCache.notModified")
+                meta["headers"].update(response.headers)
+                meta["fetched"] = time.time()
+                network.writeEntry(network.cacheDir, url, meta)
+                response = network.fromEntry(url, meta, body)
+            elif ttl is not None and response.ok:
+                instrumentation.count("httpCache.miss")
+                meta = network.entryMeta(url, response)
+                network.writeEntry(network.cacheDir, url, meta, response.content)
+        if network.mode == "record" and response.ok:
+            meta = network.entryMeta(url, response)
+            network.writeEntry(network.recordDir, url, meta, response.content)
+        return response
+
+    def stream(url: str, chunkBytes: int = 1 << 20, timeout: float = 60):
+        """Yields a large response body in chunks without holding it in memory.
+
+        Not cached, but recorded and replayed like `get`.
+        """
+        if network.mode == "replay":
+            bodyPath, _ = network.entryPaths(network.recordDir, url)
+            if not os.path.exists(bodyPath):
+                raise ReplayMissError(f"No recorded response for {url}")
+            with open(bodyPath, "rb") as f:
+                yield from iter(lambda: f.read(chunkBytes), b"")
+            return
+        with network.fetch(url, timeout=timeout, stream=True) as response:
+            response.raise_for_status()
+            if network.mode != "record":
+                yield from response.iter_content(chunk_size=chunkBytes)
+                return
+            os.makedirs(network.recordDir, exist_ok=True)
+            bodyPath, _ = network.entryPaths(network.recordDir, url)
+            tmpPath = f"{bodyPath}.{threading.get_ident()}.tmp"
+            with open(tmpPath, "wb") as f:
+                for chunk in response.iter_content(chunk_size=chunkBytes):
+                    f.write(chunk)
+                    yield chunk
+            os.replace(tmpPath, bodyPath)
+            network.writeEntry(network.recordDir, url, network.entryMeta(url, response))
+
+    def requireLive(url: str):
+        """Raises ReplayMissError when replaying, for fetches that cannot be recorded."""
+        if network.mode == "replay":
+            raise ReplayMissError(f"No recorded response for {url}")
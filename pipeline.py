@@ -0,0 +1,149 @@
+"""Incremental ingestion: fetch, store and classify only what is new since the last run.
+
+Usage:
+    python pipeline.py pioneer modern [--start 2025-01-01] [--workers 4]
+"""
+
+## Imports
+
+import argparse
+import datetime as dt
+import logging
+
+from deckStore import deckStore, deckStorePath
+from instrumentation import instrumentation
+from mtgoScraper import OracleTable, mtgoScrape
+
+## Pipeline
+
+# Tournaments are sometimes published a few days after they are played, so each
+# run lists again from this many days before the watermark. Already stored
+# tournaments are skipped by the store, so the overlap costs one index request.
+lookbackDays = 7
+
+# Stay under SQLite's bound parameter limit when reading tournaments back
+urlBatchSize = 500
+
+
+class pipeline:
+    def listingStart(con, format: str, startDate, lookback: int = lookbackDays):
+        """First tournament date to list for a format: shortly before its watermark,
+        or startDate on the first run.
+        """
+        watermark = deckStore.watermark(con, format)
+        if watermark is None:
+            if startDate is None:
+                raise ValueError(
+                    f"No watermark stored for {format}, a start date is needed for the first run."
+                )
+            return startDate
+        return watermark - dt.timedelta(days=lookback)
+
+    def classifyStored(con, format: str, path: str = deckStorePath, table=None):
+        """Classifies every stored tournament of a format that has no deck summaries yet.
+
+        Returns:
+            int: Number of decks classified
+        """
+        urls = deckStore.unclassifiedUrls(con, format)
+        classified = 0
+        for i in range(0, len(urls), urlBatchSize):
+            deckDf = deckStore.read(format, path=path, urls=urls[i : i + urlBatchSize])
+            if len(deckDf) == 0:
+                continue
+            summaryDf = mtgoScrape.classifyDecks(deckDf, format, table)
+            classified += deckStore.writeSummaries(con, summaryDf)
+        return classified
+
+    @instrumentation.run("pipeline.run")
+    def run(
+        formats,
+        startDate=None,
+        endDate=None,
+        workers: int = 4,
+        path: str = deckStorePath,
+        lookback: int = lookbackDays,
+    ):
+        """Brings the store up to date for each format.
+
+        Lists tournaments from each format's watermark, fetches and stores only the
+        tournaments not stored yet, classifies only the decks without summaries and
+        moves the watermarks forward. Work scales with what is new, not with history.
+
+        Args:
+            formats (str | list): MTG Format, or list of formats
+            startDate (date, optional): Where to start formats that have never been ingested
+            endDate (date, optional): Last tournament date to list. Defaults to today.
+            workers (int, optional): Concurrent requests. Defaults to 4.
+            path (str, optional): Deck store path
+            lookback (int, optional): Days re-listed before each watermark
+
+        Returns:
+            dict: {format: {"tournaments": newly stored, "decks": newly classified}}
+        """
+        if isinstance(formats, str):
+            formats = [formats]
+        if endDate is None:
+            endDate = dt.date.today()
+        con = deckStore.connect(path)
+        starts = {
+            x: pipeline.listingStart(con, x, startDate, lookback) for x in formats
+        }
+        tournInfoList = [
+            x
+            for x in mtgoScrape.formatDeckListRange(
+                formats, min(starts.values()), endDate, workers
+            )
+            if x["date"] >= starts[x["format"]]
+        ]
+        written = deckStore.ingest(tournInfoList, workers, path)
+        done = deckStore.storedUrls(con) | deckStore.abandonedUrls(con)
+        table = None
+        results = {}
+        for eachFormat in formats:
+            if deckStore.unclassifiedUrls(con, eachFormat) and table is None:
+                table = OracleTable.shared()
+            results[eachFormat] = {
+                "tournaments": sum(x["format"] == eachFormat for x in written),
+                "decks": pipeline.classifyStored(con, eachFormat, path, table),
+            }
+            instrumentation.count(
+                "pipeline.tournaments", results[eachFormat]["tournaments"]
+            )
+            listed = [x for x in tournInfoList if x["format"] == eachFormat]
+            # Stop at the first tournament that could not be stored and is still
+            # retried, so it is listed again. With nothing listed the watermark stays.
+            watermark = min(
+                (x["date"] for x in listed if x["url"] not in done),
+                default=max(
+                    (x["date"] for x in listed),
+                    default=deckStore.watermark(con, eachFormat) or starts[eachFormat],
+                ),
+            )
+            deckStore.setWatermark(con, eachFormat, watermark)
+            logging.info(
+                f"{eachFormat}: {results[eachFormat]['tournaments']} new tournament(s), "
+                f"{results[eachFormat]['decks']} deck(s) classified."
+            )
+        con.close()
+        return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("formats", nargs="+")
+    parser.add_argument(
+        "--start",
+        type=dt.date.fromisoformat,
+        help="First date for formats with no watermark yet",
+    )
+    parser.add_argument("--end", type=dt.date.fromisoformat, help="Defaults to today")
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--store", default=deckStorePath)
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+    results = pipeline.run(args.formats, args.start, args.end, args.workers, args.store)
+    for eachFormat, counts in results.items():
+        print(
+            f"{eachFormat}: {counts['tournaments']} tournament(s), {counts['decks']} deck(s)"
+        )